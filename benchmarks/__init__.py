@@ -0,0 +1,6 @@
+# benchmarks/__init__.py
+"""Офлайн-бенчмарки разбора страниц и ответов API Ozon.
+
+Запуск из корня проекта:
+    python -m benchmarks.run
+"""
@@ -0,0 +1,98 @@
+# benchmarks/fake_telegram.py
+"""Заглушка Telegram Bot API для нагрузочных тестов.
+
+Принимает запросы python-telegram-bot (Bot(token, base_url=...)),
+отвечает как настоящий API и запоминает время получения каждого
+сообщения. Часть ответов можно сделать ошибкой 429 (retry_after), чтобы
+проверить поведение NotificationDispatcher под ограничениями Telegram.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTelegram:
+    def __init__(self, flood_rate=0.0, retry_after=1, seed=0):
+        """
+        :param flood_rate: доля ответов 429 Too Many Requests
+        :param retry_after: сколько секунд просить подождать в ответах 429
+        """
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.messages = []  # (время получения, chat_id, текст)
+        self.stats = {'requests': 0, 'messages': 0, 'flood': 0}
+        self.server = None
+
+    def handle(self, method, params):
+        """Ответ Bot API на вызов method с параметрами params"""
+        with self.lock:
+            self.stats['requests'] += 1
+
+            if method == 'getMe':
+                return {'ok': True, 'result': {
+                    'id': 1, 'is_bot': True, 'first_name': 'Load test', 'username': 'load_test_bot',
+                }}
+
+            if method != 'sendMessage':
+                return {'ok': True, 'result': True}
+
+            if self.random.random() < self.flood_rate:
+                self.stats['flood'] += 1
+                return {'ok': False, 'error_code': 429,
+                        'description': f'Too Many Requests: retry after {self.retry_after}',
+                        'parameters': {'retry_after': self.retry_after}}
+
+            chat_id = int(params.get('chat_id'))
+            text = params.get('text', '')
+            self.messages.append((time.time(), chat_id, text))
+            self.stats['messages'] += 1
+            return {'ok': True, 'result': {
+                'message_id': self.stats['messages'],
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': text,
+            }}
+
+    def start(self, host='127.0.0.1', port=0):
+        """Запуск сервера в фоновом потоке; возвращает base_url для Bot"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+                if 'json' in (self.headers.get('Content-Type') or ''):
+                    params = json.loads(body or '{}')
+                else:
+                    # PTB передаёт параметры формой, сложные значения - JSON-строками
+                    params = {key: values[0] for key, values in parse_qs(body).items()}
+
+                result = fake.handle(self.path.rsplit('/', 1)[-1], params)
+                data = json.dumps(result).encode('utf-8')
+                self.send_response(200 if result['ok'] else result['error_code'])
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}/bot"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
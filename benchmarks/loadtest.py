@@ -0,0 +1,285 @@
+# benchmarks/loadtest.py
+"""Нагрузочный тест проверки цен на локальных заглушках Ozon и Telegram.
+
+Заполняет отдельную базу товарами, пользователями и подписками, направляет
+бота на MockOzon (OZON_BASE_URL) и FakeTelegram (base_url Bot API) и
+прогоняет полные циклы проверки и рассылки: check_prices (--mode interval)
+или CheckScheduler (--mode adaptive/rolling) в течение --duration секунд.
+В конце печатает товары в минуту, исходы проверок, задержку уведомлений
+(от изменения цены на "Ozon" до получения сообщения "Telegram") и память.
+
+    python -m benchmarks.loadtest --products 10000 --subscriptions 50000 --workers 50
+    python -m benchmarks.loadtest --products 2000 --mode rolling --duration 120 --json load.json
+"""
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import logging
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from .fake_telegram import FakeTelegram
+from .mock_ozon import MockOzon
+from .stats import percentile
+
+try:
+    import psutil
+except ImportError:  # Необязательная зависимость - только для текущего RSS
+    psutil = None
+
+
+def parse_args(argv=None):
+    args = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    args.add_argument('--products', type=int, default=10000)
+    args.add_argument('--users', type=int, default=5000)
+    args.add_argument('--subscriptions', type=int, default=50000)
+    args.add_argument('--workers', type=int, default=50, help='параллельных проверок (CHECK_WORKERS)')
+    args.add_argument('--mode', choices=('interval', 'adaptive', 'rolling'), default='interval')
+    args.add_argument('--cycles', type=int, default=2, help='циклов check_prices в режиме interval')
+    args.add_argument('--duration', type=float, default=120, help='секунд работы CheckScheduler')
+    args.add_argument('--check-interval', type=int, default=60, help='CHECK_INTERVAL для adaptive/rolling')
+    args.add_argument('--latency-ms', type=float, default=200, help='средняя задержка ответа Ozon')
+    args.add_argument('--churn', type=float, default=0.05, help='вероятность изменения цены при запросе')
+    args.add_argument('--error-rate', type=float, default=0.01, help='доля ответов 503')
+    args.add_argument('--captcha-rate', type=float, default=0.01, help='доля страниц капчи')
+    args.add_argument('--page-kb', type=int, default=50, help='размер страницы товара')
+    args.add_argument('--flood-rate', type=float, default=0.0, help='доля ответов 429 от Telegram')
+    args.add_argument('--digest-window', type=float, default=5, help='NOTIFY_DIGEST_WINDOW')
+    args.add_argument('--database-url', help='по умолчанию - SQLite во временном каталоге')
+    args.add_argument('--json', help='сохранить отчёт в файл')
+    args.add_argument('--verbose', action='store_true', help='не глушить логи и вывод парсеров')
+    args.add_argument('--seed', type=int, default=0)
+    return args.parse_args(argv)
+
+
+def configure_env(options, ozon_url, database_url):
+    """Настройки бота для теста; должны быть заданы до импорта bot.config"""
+    os.environ.update({
+        'DATABASE_URL': database_url,
+        'OZON_BASE_URL': ozon_url,
+        'OZON_API_URL': ozon_url,
+        'TELEGRAM_TOKEN': '123456:load-test',
+        'FETCH_TIERS': 'direct_html',  # Браузер в нагрузочном тесте не участвует
+        'CHECK_WORKERS': str(options.workers),
+        'CHECK_REQUEST_DELAY': '0',
+        'HTTP_PER_HOST_LIMIT': str(max(options.workers, 50)),
+        'PRODUCT_CACHE_TTL': '0',  # Иначе повторные циклы отвечались бы из кэша
+        'NOTIFY_DIGEST_WINDOW': str(options.digest_window),
+        'SCHEDULE_MODE': options.mode,
+        'CHECK_INTERVAL': str(options.check_interval),
+        'CHECK_MIN_INTERVAL': str(max(options.check_interval // 4, 1)),
+        'SCHEDULER_REFRESH_INTERVAL': '30',
+    })
+
+
+def seed_database(db, mock, options):
+    """Пользователи, товары и случайные подписки одной пачкой вставок"""
+    from sqlalchemy import insert
+
+    from bot.database import Product, User, UserProduct
+    from bot.links import canonical_product_url
+
+    rnd = random.Random(options.seed)
+    now = datetime.utcnow()
+    product_ids = [str(1000000 + index) for index in range(options.products)]
+    subscriptions = min(options.subscriptions, options.users * options.products)
+
+    pairs = set()
+    while len(pairs) < subscriptions:
+        pairs.add((rnd.randint(1, options.users), rnd.randint(1, options.products)))
+
+    with db.engine.begin() as conn:
+        conn.execute(insert(User), [
+            {'telegram_id': 100000 + index, 'username': f'load{index}', 'created_at': now}
+            for index in range(options.users)
+        ])
+        conn.execute(insert(Product), [
+            {
+                'url': canonical_product_url(product_id),
+                'product_id': product_id,
+                'name': f"Тестовый товар {product_id}",
+                'current_price': mock.price(product_id),
+                'previous_price': mock.price(product_id),
+                'last_check': now,
+                'created_at': now,
+            }
+            for product_id in product_ids
+        ])
+        conn.execute(insert(UserProduct), [
+            {'user_id': user_id, 'product_id': product_id, 'created_at': now}
+            for user_id, product_id in sorted(pairs)
+        ])
+
+    return subscriptions
+
+
+def notification_latencies(mock, fake):
+    """Задержки от изменения цены до получения сообщения, по каждому товару в каждом сообщении"""
+    changes = {product_id: sorted(times) for product_id, times in mock.change_log.items()}
+    latencies = []
+    for received_at, chat_id, text in fake.messages:
+        for product_id in re.findall(r'/product/(\d+)/', text):
+            times = changes.get(product_id)
+            if not times:
+                continue
+            # Последнее изменение цены до получения сообщения
+            position = bisect.bisect_right(times, received_at)
+            if position:
+                latencies.append(received_at - times[position - 1])
+    return sorted(latencies)
+
+
+def memory_mb():
+    # ru_maxrss - в килобайтах на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    current = psutil.Process().memory_info().rss / 1024 / 1024 if psutil else None
+    return peak, current
+
+
+async def run_load_test(options, mock, fake, telegram_url):
+    from bot.main import PriceTrackerBot
+    from bot.notifier import NotificationDispatcher, create_bot
+    from bot.scheduler import CheckScheduler
+
+    bot = PriceTrackerBot()
+    subscriptions = seed_database(bot.db.db, mock, options)
+    outcomes = {'changed': 0, 'unchanged': 0, 'failed': 0}
+
+    check_product = bot._check_product
+
+    async def counted_check(product, application):
+        changed = await check_product(product, application)
+        outcomes['failed' if changed is None else 'changed' if changed else 'unchanged'] += 1
+        return changed
+
+    bot._check_product = counted_check
+    cycles = []
+
+    async with create_bot(bot.config.TELEGRAM_TOKEN, base_url=telegram_url) as telegram:
+        bot.notifier = NotificationDispatcher(telegram)
+        started = time.monotonic()
+
+        if options.mode == 'interval':
+            for _ in range(options.cycles):
+                cycle_started = time.monotonic()
+                await bot.check_prices(None)
+                cycles.append(time.monotonic() - cycle_started)
+        else:
+            scheduler = CheckScheduler(
+                bot.db,
+                check=lambda product: bot._check_product(product, None),
+                workers=bot.pool.size,
+                on_tick=lambda: bot._send_alerts(None),
+                mode=options.mode,
+            )
+            task = asyncio.create_task(scheduler.run())
+            await asyncio.sleep(options.duration)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        checking_time = time.monotonic() - started
+
+        # Дожидаемся отправки всего накопленного
+        await bot._send_alerts(None)
+        bot.notifier.flush()
+        deadline = time.monotonic() + 300
+        while time.monotonic() < deadline:
+            stats = bot.notifier.stats
+            if not bot.notifier.pending()['queued'] and stats['sent'] + stats['failed'] >= stats['queued']:
+                break
+            await asyncio.sleep(0.5)
+
+        notifier_stats = dict(bot.notifier.stats)
+        await bot.notifier.stop()
+
+    await bot.fetcher.close()
+
+    checked = sum(outcomes.values())
+    latencies = notification_latencies(mock, fake)
+    peak_rss, current_rss = memory_mb()
+
+    return {
+        'mode': options.mode,
+        'products': options.products,
+        'users': options.users,
+        'subscriptions': subscriptions,
+        'workers': options.workers,
+        'checked': checked,
+        'checking_seconds': checking_time,
+        'products_per_minute': checked / checking_time * 60 if checking_time else 0.0,
+        'cycle_seconds': cycles,
+        'outcomes': outcomes,
+        'ozon': dict(mock.stats),
+        'telegram': dict(fake.stats),
+        'notifier': notifier_stats,
+        'notification_latency_s': {
+            'n': len(latencies),
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else 0.0,
+        },
+        'memory_mb': {'peak_rss': peak_rss, 'rss': current_rss},
+    }
+
+
+def print_report(report):
+    latency = report['notification_latency_s']
+    memory = report['memory_mb']
+    print(
+        f"\nРежим {report['mode']}: товаров {report['products']}, пользователей {report['users']}, "
+        f"подписок {report['subscriptions']}, воркеров {report['workers']}\n"
+        f"Проверено товаров: {report['checked']} за {report['checking_seconds']:.1f} с "
+        f"({report['products_per_minute']:.0f} в минуту)\n"
+        f"Циклы: {', '.join(f'{seconds:.1f} с' for seconds in report['cycle_seconds']) or '-'}\n"
+        f"Исходы: {report['outcomes']}\n"
+        f"Ozon: {report['ozon']}\n"
+        f"Telegram: {report['telegram']}, очередь уведомлений: {report['notifier']}\n"
+        f"Задержка уведомлений ({latency['n']}): p50 {latency['p50']:.2f} с, p90 {latency['p90']:.2f} с, "
+        f"p99 {latency['p99']:.2f} с, макс. {latency['max']:.2f} с\n"
+        f"Память: пик RSS {memory['peak_rss']:.0f} МБ"
+        + (f", сейчас {memory['rss']:.0f} МБ" if memory['rss'] is not None else '')
+    )
+
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    mock = MockOzon(options.latency_ms, options.churn, options.error_rate, options.captcha_rate,
+                    options.page_kb, seed=options.seed)
+    fake = FakeTelegram(flood_rate=options.flood_rate, seed=options.seed)
+    ozon_url = mock.start()
+    telegram_url = fake.start()
+
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    configure_env(options, ozon_url, options.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}")
+
+    quiet = open(os.devnull, 'w')
+    try:
+        with contextlib.redirect_stdout(sys.stdout if options.verbose else quiet):
+            if not options.verbose:
+                logging.disable(logging.INFO)
+            report = asyncio.run(run_load_test(options, mock, fake, telegram_url))
+    finally:
+        logging.disable(logging.NOTSET)
+        quiet.close()
+        mock.stop()
+        fake.stop()
+
+    print_report(report)
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
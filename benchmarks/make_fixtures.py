@@ -0,0 +1,178 @@
+# benchmarks/make_fixtures.py
+"""Генерация фикстур для бенчмарков.
+
+Страницы повторяют устройство страницы товара Ozon: сотни карточек в
+полках рекомендаций, крупный JSON состояния виджетов и ld+json ближе к
+концу документа, - так что время разбора сопоставимо с настоящими
+страницами. У товаров из LD_JSON_IN_HEAD ld+json стоит в <head>.
+Вывод детерминирован: одинаковые фикстуры при каждом запуске.
+
+Настоящие ответы Ozon можно записать поверх синтетических:
+    python -m benchmarks.run --record 1969863705
+"""
+import json
+import os
+import random
+
+import requests
+
+from bot.ozon_parser import GRAPHQL_URL, MOBILE_API_URL, OzonParser
+
+from .replay import load_index, request_key, save_index
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# product_id -> (название, цена, старая цена, в наличии)
+PRODUCTS = {
+    '1001': ('Смартфон Example X 8/256 ГБ, черный', 12990, 15490, True),
+    '1002': ('Наушники беспроводные Example Buds Pro, белые', 4590, 5990, False),
+    '1003': ('Пылесос Example Clean 3000, серый', 8990, 10990, True),
+}
+# Страницы с ld+json в <head>: на них видно, что даёт потоковое чтение с остановкой
+LD_JSON_IN_HEAD = {'1003'}
+
+WORDS = ('чехол', 'кабель', 'зарядка', 'стекло', 'набор', 'держатель', 'адаптер', 'ремешок',
+         'колонка', 'сумка', 'пленка', 'подставка', 'переходник', 'аккумулятор')
+
+
+def rub(value):
+    return f"{value:,}".replace(',', ' ') + ' ₽'
+
+
+def _card(rnd, index):
+    name = ' '.join(rnd.choice(WORDS) for _ in range(4)).capitalize()
+    price = rnd.randint(99, 9999)
+    return (
+        f'<div class="tile-root" data-index="{index}">'
+        f'<a class="tile-hover-target" href="/product/{name.replace(" ", "-")}-{100000 + index}/">'
+        f'<div class="tile-image"><img loading="lazy" src="https://ir.ozone.ru/s3/multimedia/{index}.jpg"></div>'
+        f'<div class="tile-price"><span class="c-price">{rub(price)}</span>'
+        f'<span class="c-price-old">{rub(price + rnd.randint(10, 500))}</span></div>'
+        f'<span class="tsBody500Medium">{name}</span></a>'
+        f'<div class="tile-rating"><span>{rnd.randint(30, 50) / 10}</span><span>{rnd.randint(1, 9000)} отзывов</span></div>'
+        f'</div>\n'
+    )
+
+
+def _widget_state(rnd, index):
+    return {
+        'id': index,
+        'trackingInfo': {'click': {'actionType': 'click', 'key': f'{rnd.getrandbits(64):x}'}},
+        'cardPrice': rnd.randint(99, 9999),
+        'title': ' '.join(rnd.choice(WORDS) for _ in range(3)),
+    }
+
+
+def build_page(product_id, rnd):
+    name, price, old_price, available = PRODUCTS[product_id]
+
+    shelves = ''.join(_card(rnd, index) for index in range(600))
+    state = json.dumps({'widgets': [_widget_state(rnd, index) for index in range(400)]}, ensure_ascii=False)
+
+    if available:
+        stock = '<button data-testid="add-to-cart-button"><span>Добавить в корзину</span></button>'
+        price_widget = (
+            '<div data-widget="webPrice"><div class="price-block">'
+            f'<span class="price-main">{rub(price)}</span>'
+            f'<span class="price-old">{rub(old_price)}</span>'
+            '</div></div>'
+        )
+        ld_json = json.dumps({
+            '@context': 'https://schema.org',
+            '@type': 'Product',
+            'name': name,
+            'sku': product_id,
+            'offers': {'@type': 'Offer', 'price': str(price), 'priceCurrency': 'RUB',
+                       'availability': 'https://schema.org/InStock'},
+        }, ensure_ascii=False)
+        ld_block = f'<script type="application/ld+json">{ld_json}</script>'
+    else:
+        # Без ld+json: разбор уходит в запасные регулярные выражения
+        stock = (
+            '<div data-widget="webOutOfStock"><div data-testid="out-of-stock">'
+            'Товара нет в наличии</div></div>'
+        )
+        price_widget = ''
+        ld_block = f'<script>window.__PRODUCT__ = {{"finalPrice": {price}}};</script>'
+
+    head_block, body_block = (ld_block, '') if product_id in LD_JSON_IN_HEAD else ('', ld_block)
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>{name} купить по выгодной цене на Ozon</title>'
+        f'<meta property="og:title" content="{name}">'
+        f'{head_block}'
+        '</head><body><div id="layoutPage">'
+        f'<div data-widget="webProductHeading"><h1 class="tsHeadline550Medium">{name}</h1></div>'
+        f'{price_widget}{stock}'
+        f'<div data-widget="skuShelfGoods">{shelves}</div>'
+        f'<div id="state-webShelf" data-state=\'{state.replace(chr(39), "&#39;")}\'></div>'
+        f'{body_block}'
+        '</div></body></html>'
+    )
+
+
+def build_graphql(product_id):
+    name, price, _, _ = PRODUCTS[product_id]
+    return {'data': {'product': {'id': product_id, 'title': name,
+                                 'price': {'price': str(price), 'formattedPrice': rub(price)}}}}
+
+
+def build_mobile(product_id, rnd):
+    """Ответ в виде entrypoint-api: состояния виджетов - JSON-строки внутри JSON"""
+    name, price, old_price, available = PRODUCTS[product_id]
+    states = {
+        f'webProductHeading-{rnd.randint(1000000, 9999999)}-default-1': json.dumps(
+            {'title': name}, ensure_ascii=False),
+        f'webPrice-{rnd.randint(1000000, 9999999)}-default-1': json.dumps(
+            {'isAvailable': available, 'price': rub(price), 'originalPrice': rub(old_price)}, ensure_ascii=False),
+    }
+    for index in range(300):
+        states[f'skuShelfGoods-{rnd.randint(1000000, 9999999)}-default-{index}'] = json.dumps(
+            _widget_state(rnd, index), ensure_ascii=False)
+    return {'layout': [{'component': key.split('-')[0], 'stateId': key} for key in states], 'widgetStates': states}
+
+
+def _prepared_post(url, payload, headers):
+    return requests.Request('POST', url, json=payload, headers=headers).prepare()
+
+
+def build_fixtures(fixtures_dir=FIXTURES_DIR):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    parser = OzonParser.__new__(OzonParser)  # Нужны только построители запросов
+    # Записанные настоящие ответы (--record) остаются в индексе
+    index = load_index(fixtures_dir)
+
+    def write(filename, content):
+        with open(os.path.join(fixtures_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    for product_id in PRODUCTS:
+        rnd = random.Random(int(product_id))
+
+        filename = f'product_{product_id}.html'
+        write(filename, build_page(product_id, rnd))
+        index[f'GET https://www.ozon.ru/product/{product_id}/'] = {
+            'status': 200, 'file': filename, 'headers': {'Content-Type': 'text/html; charset=utf-8'},
+        }
+
+        filename = f'graphql_{product_id}.json'
+        write(filename, json.dumps(build_graphql(product_id), ensure_ascii=False))
+        request = _prepared_post(GRAPHQL_URL, *parser._graphql_request(product_id))
+        index[request_key(request)] = {
+            'status': 200, 'file': filename, 'headers': {'Content-Type': 'application/json'},
+        }
+
+        filename = f'mobile_{product_id}.json'
+        write(filename, json.dumps(build_mobile(product_id, rnd), ensure_ascii=False))
+        request = _prepared_post(MOBILE_API_URL, *parser._mobile_request(product_id))
+        index[request_key(request)] = {
+            'status': 200, 'file': filename, 'headers': {'Content-Type': 'application/json'},
+        }
+
+    save_index(fixtures_dir, index)
+    return index
+
+
+if __name__ == '__main__':
+    for key in build_fixtures():
+        print(key)
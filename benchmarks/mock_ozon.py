@@ -0,0 +1,172 @@
+# benchmarks/mock_ozon.py
+"""Локальная заглушка Ozon для нагрузочных тестов.
+
+Отдаёт страницы /product/<id>/ с ld+json (как настоящий Ozon) с
+настраиваемой задержкой; цена товара время от времени меняется, часть
+ответов - ошибки 503 и страницы капчи. Бот направляется на заглушку через
+OZON_BASE_URL.
+
+    python -m benchmarks.mock_ozon --port 8081 --latency-ms 200 --churn 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PRODUCT_PATH_RE = re.compile(r'^/product/(?:[^/]*-)?(\d+)/?')
+
+CAPTCHA_PAGE = (
+    '<!DOCTYPE html><html><head><title>Доступ ограничен</title></head><body>'
+    '<h1>Подтвердите, что вы не робот</h1><div class="captcha"></div></body></html>'
+)
+
+
+class MockOzon:
+    """Состояние заглушки: цены товаров, моменты их изменения и счётчики ответов"""
+
+    def __init__(self, latency_ms=200, churn=0.05, error_rate=0.0, captcha_rate=0.0,
+                 page_kb=50, seed=0):
+        """
+        :param latency_ms: средняя задержка ответа (фактическая - от 0.5 до 1.5 от неё)
+        :param churn: вероятность, что при очередном запросе цена товара изменится
+        :param error_rate: доля ответов 503
+        :param captcha_rate: доля ответов со страницей капчи вместо товара
+        :param page_kb: размер страницы (добивается разметкой, как у рекомендаций на Ozon)
+        """
+        self.latency = latency_ms / 1000
+        self.churn = churn
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self.padding = '<div class="tile-root"><span>Рекомендуем</span></div>' * (page_kb * 1024 // 50)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.prices = {}  # product_id -> текущая цена
+        self.change_log = {}  # product_id -> моменты изменения цены (time.time())
+        self.stats = {'requests': 0, 'pages': 0, 'errors': 0, 'captchas': 0, 'changes': 0}
+        self.server = None
+
+    def price(self, product_id):
+        """Цена товара; при очередном запросе с вероятностью churn меняется на 5-25%"""
+        with self.lock:
+            price = self.prices.get(product_id)
+            if price is None:
+                price = self.prices[product_id] = float(1000 + int(product_id) % 9000)
+            elif self.random.random() < self.churn:
+                factor = 1 + self.random.uniform(0.05, 0.25) * self.random.choice((-1, 1))
+                price = self.prices[product_id] = round(price * factor, 2)
+                self.change_log.setdefault(product_id, []).append(time.time())
+                self.stats['changes'] += 1
+            return price
+
+    def page(self, product_id):
+        name = f"Тестовый товар {product_id}"
+        price = self.price(product_id)
+        ld_json = json.dumps({
+            '@context': 'https://schema.org',
+            '@type': 'Product',
+            'name': name,
+            'offers': {'@type': 'Offer', 'price': str(price), 'priceCurrency': 'RUB'},
+        }, ensure_ascii=False)
+        return (
+            '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+            f'<title>{name}</title></head><body>'
+            f'<div data-widget="webProductHeading"><h1>{name}</h1></div>'
+            f'<div data-widget="webPrice"><span>{price} ₽</span></div>'
+            f'<div data-widget="skuShelfGoods">{self.padding}</div>'
+            f'<script type="application/ld+json">{ld_json}</script>'
+            '</body></html>'
+        )
+
+    def respond(self, path):
+        """(статус, тело) ответа на GET path"""
+        with self.lock:
+            self.stats['requests'] += 1
+            roll = self.random.random()
+            delay = self.latency * self.random.uniform(0.5, 1.5)
+
+        time.sleep(delay)
+
+        match = PRODUCT_PATH_RE.match(path)
+        if not match:
+            return 404, 'Not found'
+
+        with self.lock:
+            if roll < self.error_rate:
+                self.stats['errors'] += 1
+                return 503, 'Service unavailable'
+            if roll < self.error_rate + self.captcha_rate:
+                self.stats['captchas'] += 1
+                return 200, CAPTCHA_PAGE
+            self.stats['pages'] += 1
+
+        return 200, self.page(match.group(1))
+
+    def start(self, host='127.0.0.1', port=0):
+        """Запуск сервера в фоновом потоке; возвращает базовый адрес"""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, как у настоящего сайта
+
+            def do_GET(self):
+                status, body = mock.respond(self.path)
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_HEAD(self):
+                self.send_response(200 if PRODUCT_PATH_RE.match(self.path) else 404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_POST(self):
+                # GraphQL и мобильное API заглушка не изображает
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    args.add_argument('--host', default='127.0.0.1')
+    args.add_argument('--port', type=int, default=8081)
+    args.add_argument('--latency-ms', type=float, default=200)
+    args.add_argument('--churn', type=float, default=0.05)
+    args.add_argument('--error-rate', type=float, default=0.0)
+    args.add_argument('--captcha-rate', type=float, default=0.0)
+    args.add_argument('--page-kb', type=int, default=50)
+    options = args.parse_args()
+
+    mock = MockOzon(options.latency_ms, options.churn, options.error_rate, options.captcha_rate, options.page_kb)
+    print(f"Заглушка Ozon: {mock.start(options.host, options.port)} (OZON_BASE_URL)")
+    try:
+        while True:
+            time.sleep(10)
+            print(mock.stats)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/replay.py
+"""Запись и воспроизведение HTTP-ответов для requests.Session.
+
+Ответы хранятся в каталоге фикстур: тело - отдельным файлом, статус и
+нужные заголовки - в index.json под ключом "МЕТОД URL" (для POST к ключу
+добавляется хэш тела, чтобы запросы разных товаров к одному API не
+смешивались). Записанные ответы называются так же, как синтетические
+фикстуры (product_<id>.html, graphql_<id>.json, mobile_<id>.json), и
+бенчмарк подхватывает их вместе с ними.
+"""
+import hashlib
+import json
+import os
+import re
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+INDEX_FILE = 'index.json'
+# Заголовки, которые нужны для воспроизведения (тип тела и редиректы)
+KEPT_HEADERS = ('Content-Type', 'Location')
+
+
+def request_key(request, with_body=True):
+    key = f"{request.method} {request.url}"
+    if with_body and request.body:
+        body = request.body if isinstance(request.body, bytes) else request.body.encode()
+        key += f" #{hashlib.sha1(body).hexdigest()[:12]}"
+    return key
+
+
+def load_index(fixtures_dir):
+    path = os.path.join(fixtures_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_index(fixtures_dir, index):
+    with open(os.path.join(fixtures_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+class ReplayAdapter(BaseAdapter):
+    """Отдаёт записанные ответы вместо сетевых запросов"""
+
+    def __init__(self, fixtures_dir):
+        super().__init__()
+        self.fixtures_dir = fixtures_dir
+        self.index = load_index(fixtures_dir)
+        self._bodies = {}  # Тела читаются с диска один раз, чтобы мерить разбор, а не диск
+
+    def _body(self, filename):
+        body = self._bodies.get(filename)
+        if body is None:
+            with open(os.path.join(self.fixtures_dir, filename), 'rb') as f:
+                body = self._bodies[filename] = f.read()
+        return body
+
+    def send(self, request, **kwargs):
+        entry = self.index.get(request_key(request)) or self.index.get(request_key(request, with_body=False))
+        if entry is None:
+            raise requests.ConnectionError(f"Нет записанного ответа для {request_key(request)}", request=request)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        response._content = self._body(entry['file']) if entry.get('file') else b''
+        response._content_consumed = True  # iter_content (stream=True) отдаёт уже прочитанное тело
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if entry['status'] == 200 else ''
+        return response
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Выполняет настоящие запросы и сохраняет ответы в каталог фикстур.
+
+    name - имя файла (без расширения) для следующих ответов, например
+    "product_1969863705"; ответы-редиректы и ответы без имени сохраняются
+    под именем из URL.
+    """
+
+    def __init__(self, fixtures_dir):
+        super().__init__()
+        self.fixtures_dir = fixtures_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+        self.index = load_index(fixtures_dir)
+        self.name = None
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+
+        key = request_key(request)
+        content_type = response.headers.get('Content-Type', '')
+        extension = 'json' if 'json' in content_type else 'html'
+        if self.name and not response.is_redirect:
+            filename = f'{self.name}.{extension}'
+        else:
+            filename = re.sub(r'[^\w.-]+', '_', key.split(' ', 1)[1])[:120] + f'.{extension}'
+
+        with open(os.path.join(self.fixtures_dir, filename), 'wb') as f:
+            f.write(response.content)
+
+        self.index[key] = {
+            'status': response.status_code,
+            'file': filename,
+            'headers': {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+        }
+        save_index(self.fixtures_dir, self.index)
+        return response
+
+
+def mount(session, adapter):
+    """Подменяет сетевой слой сессии requests"""
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,339 @@
+# benchmarks/run.py
+"""Бенчмарк путей извлечения данных о товаре на сохранённых ответах Ozon.
+
+HTTP-методы OzonParser получают ответы из фикстур через ReplayAdapter,
+Selenium-методы работают со страницами фикстур, открытыми через file://.
+Для каждого метода печатаются задержки (среднее, p50, p90, p99, максимум
+в мс) и пропускная способность; --json сохраняет результаты вместе с
+коммитом, чтобы сравнивать их между изменениями парсера.
+
+Отдельно сравниваются --tabs вкладок одного браузера и столько же отдельных
+браузеров на заглушке Ozon с сетевой задержкой: страниц в секунду, память
+браузеров (нужен psutil) и страниц в секунду на гигабайт.
+
+    python -m benchmarks.run                       # всё, Selenium - если браузер запускается
+    python -m benchmarks.run --no-selenium -n 500
+    python -m benchmarks.run --tabs 8 --tab-pages 200
+    python -m benchmarks.run --json results.json
+    python -m benchmarks.run --record 1969863705   # записать настоящие ответы Ozon в фикстуры
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import queue
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bot.html_stream import STREAM_CHUNK_SIZE, LdJsonScanner
+from bot.ozon_parser import OzonParser
+from bot.widget_states import product_from_states, states_from_json
+
+from .make_fixtures import FIXTURES_DIR, build_fixtures
+from .replay import RecordingAdapter, ReplayAdapter, load_index, mount
+from .stats import format_table, measure, summarize
+
+
+# Файлы фикстур по методам: синтетические и записанные --record называются одинаково
+RECORDED_FILES = {
+    '_try_direct_html': 'product_{}',
+    '_try_graphql_api': 'graphql_{}',
+    '_try_mobile_api': 'mobile_{}',
+}
+
+
+def _read(filename):
+    with open(os.path.join(FIXTURES_DIR, filename), encoding='utf-8') as f:
+        return f.read()
+
+
+def _read_json(filename):
+    """Разобранный JSON-ответ из фикстур или None, если метод не был записан"""
+    try:
+        return json.loads(_read(filename))
+    except (OSError, ValueError):
+        return None
+
+
+def fixture_products():
+    """ID товаров, страницы которых есть в фикстурах (синтетические и записанные)"""
+    return sorted(
+        path.stem.split('_', 1)[1]
+        for path in pathlib.Path(FIXTURES_DIR).glob('product_*.html')
+    )
+
+
+def _legacy_mobile_price(data):
+    """Прежний запасной разбор ответа мобильного API: весь ответ в строку и поиск "price" регуляркой"""
+    price_match = re.search(r'"price":\s*["\']?(\d+(?:[.,]\d+)?)', json.dumps(data))
+    return float(price_match.group(1).replace(',', '.')) if price_match else None
+
+
+def http_benchmarks(iterations, warmup):
+    """Разбор HTML и JSON и полные _try_* методы поверх воспроизводимых ответов"""
+    parser = OzonParser()
+    parser.config.HTTP_STREAM_HTML = True
+    mount(parser.session, ReplayAdapter(FIXTURES_DIR))
+    # Та же загрузка страницы без потокового чтения (по умолчанию) - для сравнения
+    buffered = OzonParser()
+    buffered.config.HTTP_STREAM_HTML = False
+    mount(buffered.session, ReplayAdapter(FIXTURES_DIR))
+    rows = []
+
+    def run(name, fn):
+        rows.append(summarize(name, measure(fn, iterations, warmup)))
+
+    for product_id in fixture_products():
+        url = f'https://www.ozon.ru/product/{product_id}/'
+        html = _read(f'product_{product_id}.html')
+        graphql = _read_json(f'graphql_{product_id}.json')
+        mobile = _read_json(f'mobile_{product_id}.json')
+
+        run(f'_parse_direct_html[{product_id}]', lambda: parser._parse_direct_html(html, product_id, url))
+        page = html.encode('utf-8')
+
+        def scan():
+            scanner = LdJsonScanner('utf-8')
+            for offset in range(0, len(page), STREAM_CHUNK_SIZE):
+                if scanner.feed(page[offset:offset + STREAM_CHUNK_SIZE]) is not None:
+                    break
+            return parser._finish_direct_html(scanner, product_id, url)
+
+        run(f'LdJsonScanner[{product_id}]', scan)
+        run(f'_extract_name_from_html[{product_id}]', lambda: parser._extract_name_from_html(html))
+        run(f'_extract_price_from_html[{product_id}]', lambda: parser._extract_price_from_html(html))
+        if graphql is not None:
+            run(f'_parse_graphql_response[{product_id}]', lambda: parser._parse_graphql_response(graphql, product_id))
+        if mobile is not None:
+            run(f'_parse_mobile_response[{product_id}]', lambda: parser._parse_mobile_response(mobile, product_id))
+            # Запасной путь мобильного API: прежний json.dumps + регулярка против обхода нужных виджетов
+            run(f'mobile_json_dumps_regex[{product_id}]', lambda: _legacy_mobile_price(mobile))
+            run(f'mobile_widget_paths[{product_id}]', lambda: product_from_states(states_from_json(mobile)))
+
+        run(f'_try_direct_html[{product_id}]', lambda: parser._try_direct_html(url, product_id))
+        run(f'_try_direct_html_buffered[{product_id}]', lambda: buffered._try_direct_html(url, product_id))
+        if graphql is not None:
+            run(f'_try_graphql_api[{product_id}]', lambda: parser._try_graphql_api(url, product_id))
+        if mobile is not None:
+            run(f'_try_mobile_api[{product_id}]', lambda: parser._try_mobile_api(url, product_id))
+
+    return rows
+
+
+def _start_browser(page_load_strategy='eager'):
+    """Обычный headless Chrome (setup_driver настроен на локальный Яндекс.Браузер)"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-renderer-backgrounding')
+    options.page_load_strategy = page_load_strategy
+    return webdriver.Chrome(options=options)
+
+
+def selenium_benchmarks(iterations, warmup):
+    """Извлечение данных из страниц фикстур, открытых в браузере через file://"""
+    from bot.selenium_parser import OzonSeleniumParser
+
+    try:
+        driver = _start_browser()
+    except Exception as e:
+        print(f"⚠️ Браузер не запустился, Selenium-бенчмарки пропущены: {e}")
+        return []
+
+    parser = OzonSeleniumParser(headless=True)
+    parser.driver = driver
+    rows = []
+
+    def run(name, fn, n=iterations):
+        rows.append(summarize(name, measure(fn, n, warmup)))
+
+    try:
+        for product_id in fixture_products():
+            page = pathlib.Path(FIXTURES_DIR, f'product_{product_id}.html').as_uri()
+
+            def load():
+                driver.get(page)
+                parser._wait_until_ready()
+
+            # Загрузка страницы заметно дольше разбора - меньше повторов
+            run(f'load_and_wait_ready[{product_id}]', load, n=max(iterations // 10, 5))
+
+            driver.get(page)
+            run(f'_extract_all_in_one[{product_id}]', parser._extract_all_in_one)
+            run(f'_extract_product_data[{product_id}]', parser._extract_product_data)
+            # Старый поэлементный путь - тоже с меньшим числом повторов
+            legacy = max(iterations // 10, 5)
+            run(f'_extract_title[{product_id}]', parser._extract_title, n=legacy)
+            run(f'_extract_price[{product_id}]', parser._extract_price, n=legacy)
+            run(f'_check_availability[{product_id}]', parser._check_availability, n=legacy)
+    finally:
+        driver.quit()
+
+    return rows
+
+
+def _run_pages(parsers, slots, urls):
+    """Загрузка urls через парсеры с slots местами (как в пуле): секунды и число разобранных страниц"""
+    free = queue.Queue()
+    for index in range(slots):
+        free.put(parsers[index % len(parsers)])
+
+    def load(url):
+        parser = free.get()
+        try:
+            return parser.get_product_info(url)
+        finally:
+            free.put(parser)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=slots) as executor:
+        results = list(executor.map(load, urls))
+    return time.perf_counter() - started, sum(1 for result in results if result and result.get('price'))
+
+
+def tabs_benchmarks(tabs, pages, latency_ms=300):
+    """Один браузер с tabs вкладками против tabs отдельных браузеров на заглушке Ozon"""
+    from bot.config import Config
+    from bot.driver_manager import browser_rss_mb
+    from bot.selenium_parser import OzonSeleniumParser
+
+    from .mock_ozon import MockOzon
+
+    mock = MockOzon(latency_ms=latency_ms, churn=0)
+    base_url = mock.start()
+    original_base_url, Config.OZON_BASE_URL = Config.OZON_BASE_URL, base_url
+    urls = [f'{base_url}/product/{1000000 + index}/' for index in range(pages)]
+    rows = []
+
+    def run(name, parsers, slots):
+        with contextlib.redirect_stdout(io.StringIO()):
+            _run_pages(parsers, slots, urls[:slots])  # Прогрев
+            seconds, parsed = _run_pages(parsers, slots, urls)
+        rss = [browser_rss_mb(parser) for parser in parsers]
+        rss = sum(rss) if None not in rss else None
+        rows.append({
+            'name': name,
+            'pages': len(urls),
+            'parsed': parsed,
+            'seconds': seconds,
+            'pages_per_s': len(urls) / seconds,
+            'rss_mb': rss,
+            'pages_per_s_per_gb': len(urls) / seconds / (rss / 1024) if rss else None,
+        })
+
+    parsers = []
+    try:
+        try:
+            for _ in range(tabs):
+                parser = OzonSeleniumParser(headless=True)
+                parser.driver = _start_browser()
+                parsers.append(parser)
+            run(f'separate_browsers[{tabs}]', parsers, tabs)
+            for parser in parsers:
+                parser.close_driver()
+
+            parser = OzonSeleniumParser(headless=True, tabs=tabs)
+            parser.driver = _start_browser(page_load_strategy='none')
+            parsers = [parser]
+            parser._open_tabs()
+            run(f'one_browser_tabs[{tabs}]', parsers, tabs)
+        except Exception as e:
+            print(f"⚠️ Браузер не запустился, сравнение вкладок пропущено: {e}")
+    finally:
+        for parser in parsers:
+            parser.close_driver()
+        Config.OZON_BASE_URL = original_base_url
+        mock.stop()
+
+    return rows
+
+
+def format_tabs_table(rows):
+    lines = [f"{'name':<24}{'pages':>8}{'parsed':>8}{'seconds':>10}{'pages/s':>10}{'rss_mb':>10}{'pages/s/GB':>12}"]
+    for row in rows:
+        rss = f"{row['rss_mb']:>10.0f}" if row['rss_mb'] else f"{'-':>10}"
+        per_gb = f"{row['pages_per_s_per_gb']:>12.2f}" if row['pages_per_s_per_gb'] else f"{'-':>12}"
+        lines.append(
+            f"{row['name']:<24}{row['pages']:>8}{row['parsed']:>8}{row['seconds']:>10.2f}"
+            f"{row['pages_per_s']:>10.2f}{rss}{per_gb}"
+        )
+    return '\n'.join(lines)
+
+
+def record(product_ids):
+    """Запись настоящих ответов Ozon для товаров в каталог фикстур (под именами, которые читает бенчмарк)"""
+    parser = OzonParser()
+    adapter = RecordingAdapter(FIXTURES_DIR)
+    mount(parser.session, adapter)
+
+    for product_id in product_ids:
+        url = f'https://www.ozon.ru/product/{product_id}/'
+        for name, filename in RECORDED_FILES.items():
+            adapter.name = filename.format(product_id)
+            print(f"{name}[{product_id}]: {getattr(parser, name)(url, product_id)}")
+    print(f"Записано ответов: {len(adapter.index)} -> {FIXTURES_DIR}")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    args = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    args.add_argument('-n', '--iterations', type=int, default=200, help='повторов на метод')
+    args.add_argument('--warmup', type=int, default=10, help='прогревочных вызовов (не учитываются)')
+    args.add_argument('--no-selenium', action='store_true', help='только HTTP-методы')
+    args.add_argument('--tabs', type=int, default=4, help='вкладок против браузеров в сравнении (0 - не сравнивать)')
+    args.add_argument('--tab-pages', type=int, default=100, help='страниц в сравнении вкладок')
+    args.add_argument('--json', help='сохранить результаты в файл')
+    args.add_argument('--record', nargs='+', metavar='PRODUCT_ID', help='записать настоящие ответы Ozon')
+    options = args.parse_args(argv)
+
+    if options.record:
+        record(options.record)
+        return
+
+    if not load_index(FIXTURES_DIR):
+        build_fixtures()
+
+    rows = http_benchmarks(options.iterations, options.warmup)
+    tab_rows = []
+    if not options.no_selenium:
+        rows += selenium_benchmarks(options.iterations, options.warmup)
+        if options.tabs > 1:
+            tab_rows = tabs_benchmarks(options.tabs, options.tab_pages)
+
+    print(format_table(rows))
+    if tab_rows:
+        print()
+        print(format_tabs_table(tab_rows))
+
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'commit': _git_commit(),
+                'created_at': datetime.utcnow().isoformat(),
+                'python': sys.version.split()[0],
+                'iterations': options.iterations,
+                'results': rows,
+                'tabs': tab_rows,
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/stats.py
+import contextlib
+import io
+import time
+
+
+def percentile(sorted_samples, q):
+    """Перцентиль q (0-100) по отсортированной выборке с линейной интерполяцией"""
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (position - lower)
+
+
+def measure(fn, iterations, warmup=0, quiet=True):
+    """Время каждого из iterations вызовов fn() в секундах (после warmup прогревочных)
+
+    quiet глушит print внутри парсеров, чтобы мерить разбор, а не вывод в консоль.
+    """
+    samples = []
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        for _ in range(warmup):
+            fn()
+        for _ in range(iterations):
+            sink.seek(0)
+            sink.truncate()
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(name, samples):
+    """Сводка по выборке: задержки в миллисекундах и пропускная способность"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'name': name,
+        'n': len(ordered),
+        'mean_ms': total / len(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p90_ms': percentile(ordered, 90) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+        'ops_per_s': len(ordered) / total if total else 0.0,
+    }
+
+
+def format_table(rows):
+    columns = ('name', 'n', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'ops_per_s')
+    width = max([len('name')] + [len(row['name']) for row in rows])
+
+    lines = [f"{'name':<{width}}" + ''.join(f"{column:>11}" for column in columns[1:])]
+    for row in rows:
+        cells = [f"{row['n']:>11}"] + [f"{row[column]:>11.3f}" for column in columns[2:-1]]
+        cells.append(f"{row['ops_per_s']:>11.1f}")
+        lines.append(f"{row['name']:<{width}}" + ''.join(cells))
+    return '\n'.join(lines)
@@ -0,0 +1,101 @@
+# bot/cache.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ProductInfoCache:
+    """Кэш информации о товарах по product_id Ozon с TTL и вытеснением LRU.
+
+    Общий для /add, /check и плановых проверок одного процесса: если товар
+    недавно загружен, страница не открывается повторно. Одновременные
+    запросы одного товара ждут одну и ту же загрузку.
+    """
+
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = ttl if ttl is not None else Config.PRODUCT_CACHE_TTL
+        self.max_size = max_size if max_size is not None else Config.PRODUCT_CACHE_SIZE
+        self._items = OrderedDict()  # product_id -> (когда загружен, информация о товаре)
+        self._in_flight = {}  # product_id -> задача загрузки
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # Запросы, дождавшиеся чужой загрузки
+
+    def get(self, product_id):
+        """Информация о товаре из кэша или None, если её нет или она устарела"""
+        item = self._items.get(product_id)
+        if item is None:
+            return None
+
+        loaded_at, info = item
+        if time.monotonic() - loaded_at > self.ttl:
+            del self._items[product_id]
+            return None
+
+        self._items.move_to_end(product_id)
+        return dict(info)
+
+    def put(self, product_id, info):
+        self._items[product_id] = (time.monotonic(), dict(info))
+        self._items.move_to_end(product_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, product_id):
+        self._items.pop(product_id, None)
+
+    async def get_or_fetch(self, product_id, fetch):
+        """Информация о товаре из кэша, иначе - результат корутины fetch().
+
+        Кэшируются только результаты с ценой: неудачная загрузка
+        повторится при следующем запросе.
+        """
+        if self.ttl <= 0:
+            return await fetch()
+
+        info = self.get(product_id)
+        if info is not None:
+            self.hits += 1
+            return info
+
+        task = self._in_flight.get(product_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(product_id, fetch))
+            self._in_flight[product_id] = task
+
+        # shield: отмена одного ожидающего не прерывает загрузку для остальных
+        info = await asyncio.shield(task)
+        return dict(info) if info else info
+
+    async def _fetch(self, product_id, fetch):
+        try:
+            info = await fetch()
+            if info and info.get('price'):
+                self.put(product_id, info)
+            return info
+        finally:
+            self._in_flight.pop(product_id, None)
+
+    def stats(self):
+        """Попадания, промахи, объединённые запросы и размер кэша"""
+        requests = self.hits + self.misses + self.coalesced
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits + self.coalesced) / requests if requests else 0.0,
+        }
+
+
+# Общий кэш процесса: его используют все ProductFetcher
+product_cache = ProductInfoCache()
@@ -10,6 +10,13 @@ class Config:
 
     # База данных
     DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///prices.db')
+    # Потоки для запросов к базе из асинхронного кода и размер пула соединений
+    DB_THREADS = int(os.getenv('DB_THREADS', '4'))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+
+    # Адреса Ozon (можно направить на локальную заглушку, см. benchmarks/loadtest.py)
+    OZON_BASE_URL = os.getenv('OZON_BASE_URL', 'https://www.ozon.ru').rstrip('/')
+    OZON_API_URL = os.getenv('OZON_API_URL', 'https://api.ozon.ru').rstrip('/')
 
     # Настройки парсера
     OZON_HEADERS = {
@@ -19,7 +26,118 @@ class Config:
     }
 
     # Интервал проверки цен (в секундах)
-    CHECK_INTERVAL = 3600  # 1 час
+    CHECK_INTERVAL = int(os.getenv('CHECK_INTERVAL', '3600'))  # 1 час
+
+    # Расписание проверок: 'adaptive' - свой интервал у каждого товара,
+    # 'rolling' - раз в CHECK_INTERVAL, но каждый товар в своём слоте внутри интервала,
+    # 'interval' - все товары разом каждые CHECK_INTERVAL секунд
+    SCHEDULE_MODE = os.getenv('SCHEDULE_MODE', 'adaptive')
+    # Границы адаптивного интервала (в секундах) и множители: при изменении цены
+    # интервал сокращается, пока цена стабильна - растёт
+    CHECK_MIN_INTERVAL = int(os.getenv('CHECK_MIN_INTERVAL', '900'))
+    CHECK_MAX_INTERVAL = int(os.getenv('CHECK_MAX_INTERVAL', '86400'))
+    CHECK_SPEEDUP_FACTOR = float(os.getenv('CHECK_SPEEDUP_FACTOR', '0.5'))
+    CHECK_BACKOFF_FACTOR = float(os.getenv('CHECK_BACKOFF_FACTOR', '1.5'))
+    # Как часто подхватывать новые товары из базы (в секундах)
+    SCHEDULER_REFRESH_INTERVAL = int(os.getenv('SCHEDULER_REFRESH_INTERVAL', '60'))
+
+    # Проверки цен в отдельных процессах (python -m bot.worker): бот тогда только
+    # принимает команды. Воркер берёт в аренду пачку из WORKER_BATCH_SIZE товаров
+    # на WORKER_LEASE_SECONDS и продлевает аренду каждые WORKER_HEARTBEAT_INTERVAL
+    # секунд; если due-товаров нет, ждёт WORKER_POLL_INTERVAL секунд
+    EXTERNAL_WORKERS = os.getenv('EXTERNAL_WORKERS', '0') == '1'
+    WORKER_ID = os.getenv('WORKER_ID')
+    WORKER_BATCH_SIZE = int(os.getenv('WORKER_BATCH_SIZE', '10'))
+    WORKER_LEASE_SECONDS = int(os.getenv('WORKER_LEASE_SECONDS', '300'))
+    WORKER_HEARTBEAT_INTERVAL = int(os.getenv('WORKER_HEARTBEAT_INTERVAL', '60'))
+    WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '5'))
+
+    # Параллельная проверка цен: число "тёплых" браузеров и размер очереди перед ними
+    CHECK_WORKERS = int(os.getenv('CHECK_WORKERS', '3'))
+    CHECK_QUEUE_SIZE = int(os.getenv('CHECK_QUEUE_SIZE', '100'))
+    # Пауза одного воркера между запросами (в секундах)
+    CHECK_REQUEST_DELAY = float(os.getenv('CHECK_REQUEST_DELAY', '2'))
+
+    # Браузеры для команд /add и /check (отдельно от пула проверки цен)
+    HANDLER_WORKERS = int(os.getenv('HANDLER_WORKERS', '2'))
+
+    # Жизненный цикл браузеров: браузер заменяется свежим после BROWSER_MAX_PAGES страниц
+    # или когда вместе с дочерними процессами занимает больше BROWSER_MAX_RSS_MB
+    # (нужен пакет psutil); 0 - без ограничения. Замена запускается заранее, в фоне
+    BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', '200'))
+    BROWSER_MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', '1500'))
+    # Запускать браузеры при старте, а не при первом запросе
+    BROWSER_PREWARM = os.getenv('BROWSER_PREWARM', '1') == '1'
+
+    # Вкладок в одном браузере, загружающих страницы одновременно (cookies и кэш общие).
+    # При SELENIUM_TABS > 1 пулы запускают в столько же раз меньше браузеров, а
+    # страница считается загруженной по готовности виджетов (как в режиме 'ready')
+    SELENIUM_TABS = int(os.getenv('SELENIUM_TABS', '1'))
+
+    # Перехват ответов страницы в Selenium (без вкладок): название, цена и наличие берутся
+    # из состояний виджетов в документе и ответах page/json/v2, как только они получены,
+    # без ожидания отрисовки; если не нашлись - из страницы, как раньше. Работает только в
+    # режиме ожидания 'ready': в режиме 'fixed' браузер грузит страницу как раньше, и паузы
+    # отсчитываются от её загрузки
+    SELENIUM_NETWORK_CAPTURE = os.getenv('SELENIUM_NETWORK_CAPTURE', '1') == '1'
+
+    # Режим ожидания страницы в Selenium: 'ready' - до появления цены и заголовка,
+    # 'fixed' - старые фиксированные паузы
+    SELENIUM_WAIT_MODE = os.getenv('SELENIUM_WAIT_MODE', 'ready')
+    # Потолок ожидания готовности страницы (в секундах)
+    SELENIUM_READY_TIMEOUT = float(os.getenv('SELENIUM_READY_TIMEOUT', '15'))
+
+    # Фильтрация ресурсов в браузере: картинки, шрифты и медиа не загружаются,
+    # запросы к хостам не из списка разрешённых (аналитика, реклама) блокируются
+    SELENIUM_BLOCK_RESOURCES = os.getenv('SELENIUM_BLOCK_RESOURCES', '1') == '1'
+    SELENIUM_ALLOWED_HOSTS = os.getenv(
+        'SELENIUM_ALLOWED_HOSTS', 'ozon.ru,*.ozon.ru,*.ozone.ru'
+    ).split(',')
+    SELENIUM_BLOCKED_URL_PATTERNS = [
+        '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',  # Картинки
+        '*.woff', '*.woff2', '*.ttf', '*.otf',  # Шрифты
+        '*.mp4', '*.webm', '*.m3u8', '*.mp3',  # Медиа
+    ]
+
+    # Асинхронный HTTP-клиент: общий пул соединений и лимит одновременных запросов к одному хосту
+    HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '200'))
+    HTTP_PER_HOST_LIMIT = int(os.getenv('HTTP_PER_HOST_LIMIT', '50'))
+    # Читать страницу товара потоком и обрывать загрузку после JSON-LD товара.
+    # Помогает, только если JSON-LD в начале страницы; по HTTP/1.1 оборванное
+    # соединение не возвращается в пул (по HTTP/2 - только поток), поэтому по умолчанию выключено
+    HTTP_STREAM_HTML = os.getenv('HTTP_STREAM_HTML', '0') == '1'
+
+    # Кэш информации о товарах: сколько секунд она считается свежей (0 - без кэша)
+    # и сколько товаров хранить
+    PRODUCT_CACHE_TTL = float(os.getenv('PRODUCT_CACHE_TTL', '120'))
+    PRODUCT_CACHE_SIZE = int(os.getenv('PRODUCT_CACHE_SIZE', '1000'))
+
+    # Методы получения товара, которые разрешено использовать (например, без selenium
+    # на сервере без браузера)
+    FETCH_TIERS = os.getenv('FETCH_TIERS', 'direct_html,graphql_api,mobile_api,selenium').split(',')
+
+    # Через сколько проверок снова пробовать самый дешёвый метод получения товара
+    FETCH_TIER_REPROBE_EVERY = int(os.getenv('FETCH_TIER_REPROBE_EVERY', '24'))
 
     # Процент изменения для уведомления
-    PRICE_CHANGE_THRESHOLD = 5  # 5%
\ No newline at end of file
+    PRICE_CHANGE_THRESHOLD = 5  # 5%
+
+    # История цен: сколько дней хранить каждое изменение и сколько - дневные минимум/максимум
+    PRICE_HISTORY_RAW_DAYS = int(os.getenv('PRICE_HISTORY_RAW_DAYS', '30'))
+    PRICE_HISTORY_DAILY_DAYS = int(os.getenv('PRICE_HISTORY_DAILY_DAYS', '730'))
+
+    # Сколько изменившихся товаров копить перед одним запросом подписчиков
+    ALERT_BATCH_SIZE = int(os.getenv('ALERT_BATCH_SIZE', '50'))
+
+    # Очередь уведомлений: общий лимит Telegram (сообщений в секунду), пауза между
+    # сообщениями в один чат, окно объединения изменений в дайджест (в секундах),
+    # число параллельных отправителей и попыток отправки
+    NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', '25'))
+    NOTIFY_PER_CHAT_INTERVAL = float(os.getenv('NOTIFY_PER_CHAT_INTERVAL', '1'))
+    NOTIFY_DIGEST_WINDOW = float(os.getenv('NOTIFY_DIGEST_WINDOW', '60'))
+    NOTIFY_SENDERS = int(os.getenv('NOTIFY_SENDERS', '8'))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '3'))
+
+    # Порт HTTP-эндпоинта метрик Prometheus (/metrics); 0 - не поднимать.
+    # У нескольких воркеров на одной машине порты должны различаться
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
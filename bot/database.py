@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import (create_engine, event, Column, Integer, String, Float, DateTime, Date,
+                        ForeignKey, Index, UniqueConstraint, func, or_)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from .config import Config
+from .metrics import DB_COMMIT_SECONDS, DB_OPERATION_SECONDS
+from .migrations import migrate
 
 Base = declarative_base()
 
@@ -27,91 +36,447 @@ class Product(Base):
     previous_price = Column(Float)
     last_check = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Адаптивное расписание: когда проверять в следующий раз и текущий интервал (в секундах)
+    next_check_at = Column(DateTime, index=True)
+    check_interval = Column(Integer)
+    # Аренда товара воркером (см. bot/worker.py): кто проверяет и до какого времени
+    lease_owner = Column(String)
+    lease_until = Column(DateTime)
 
 
 class UserProduct(Base):
     __tablename__ = 'user_products'
+    __table_args__ = (
+        # Уникальная пара заодно служит индексом для поиска по user_id
+        UniqueConstraint('user_id', 'product_id', name='uq_user_products_user_product'),
+        Index('ix_user_products_product_id', 'product_id'),
+    )
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False)
-    product_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class PriceHistory(Base):
+    """История цен: строка пишется только при изменении цены"""
+    __tablename__ = 'price_history'
+    __table_args__ = (
+        Index('ix_price_history_product_ts', 'product_id', 'ts'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+    price = Column(Integer, nullable=False)  # В копейках
+
+
+class PriceHistoryDaily(Base):
+    """Прореженная история цен: минимум и максимум за день для записей старше PRICE_HISTORY_RAW_DAYS"""
+    __tablename__ = 'price_history_daily'
+
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    min_price = Column(Integer, nullable=False)  # В копейках
+    max_price = Column(Integer, nullable=False)  # В копейках
+
+
+class ShortLink(Base):
+    """Развёрнутые короткие ссылки Ozon (ozon.ru/t/...)"""
+    __tablename__ = 'short_links'
+
+    short_url = Column(String, primary_key=True)  # Нормализованная ссылка, см. links.short_link_key
+    product_id = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def _setup_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def _commit_started(session):
+    session.info['commit_started'] = time.perf_counter()
+
+
+def _commit_finished(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def to_kopecks(price):
+    """Цена в рублях -> целое число копеек"""
+    return int(round(price * 100))
+
+
 class Database:
+    """Синхронный доступ к базе: отдельная сессия на каждую операцию.
+
+    Методы потокобезопасны и возвращают отсоединённые объекты с уже
+    загруженными полями, поэтому их можно вызывать из пула потоков
+    (см. AsyncDatabase).
+    """
+
     def __init__(self):
         self.config = Config()
-        self.engine = create_engine(self.config.DATABASE_URL)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+
+        if self.config.DATABASE_URL.startswith('sqlite'):
+            # Соединения используются из разных потоков; при блокировке ждём, а не падаем
+            self.engine = create_engine(
+                self.config.DATABASE_URL,
+                connect_args={'check_same_thread': False, 'timeout': 30},
+            )
+        else:
+            self.engine = create_engine(
+                self.config.DATABASE_URL,
+                pool_size=self.config.DB_POOL_SIZE,
+                pool_pre_ping=True,
+            )
+
+        if self.engine.dialect.name == 'sqlite':
+            # SQLite проверяет внешние ключи только если попросить,
+            # а WAL позволяет читать во время чужой записи
+            event.listen(self.engine, 'connect', _setup_sqlite_connection)
+
+        # Создание таблиц и обновление схемы существующей базы
+        migrate(self.engine, Base.metadata)
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        event.listen(self.Session, 'before_commit', _commit_started)
+        event.listen(self.Session, 'after_commit', _commit_finished)
 
     def add_user(self, telegram_id, username):
-        user = self.session.query(User).filter_by(telegram_id=telegram_id).first()
-        if not user:
-            user = User(telegram_id=telegram_id, username=username)
-            self.session.add(user)
-            self.session.commit()
-        return user
+        with self.Session() as session:
+            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            if not user:
+                user = User(telegram_id=telegram_id, username=username)
+                session.add(user)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Того же пользователя одновременно добавил другой запрос
+                    session.rollback()
+                    user = session.query(User).filter_by(telegram_id=telegram_id).one()
+            return user
 
     def add_product(self, url, product_id, name, price):
-        product = self.session.query(Product).filter_by(product_id=product_id).first()
-        if product:
+        with self.Session() as session:
+            product = session.query(Product).filter_by(product_id=product_id).first()
+            if not product:
+                product = Product(
+                    url=url,
+                    product_id=product_id,
+                    name=name,
+                    current_price=round(price, 2),
+                    previous_price=round(price, 2),
+                    last_check=datetime.utcnow()
+                )
+                session.add(product)
+                try:
+                    session.flush()  # Нужен product.id для истории
+                except IntegrityError:
+                    # Тот же товар одновременно добавил другой запрос - обновляем его строку
+                    session.rollback()
+                    product = session.query(Product).filter_by(product_id=product_id).one()
+                else:
+                    self._record_price(session, product, price, first=True)
+                    session.commit()
+                    return product
+
+            self._record_price(session, product, price)
             # Округляем цены
             product.previous_price = round(product.current_price, 2) if product.current_price else price
             product.current_price = round(price, 2)
             product.last_check = datetime.utcnow()
-        else:
-            product = Product(
-                url=url,
-                product_id=product_id,
-                name=name,
-                current_price=round(price, 2),
-                previous_price=round(price, 2),
-                last_check=datetime.utcnow()
-            )
-            self.session.add(product)
-        self.session.commit()
-        return product
+            session.commit()
+            return product
+
+    @staticmethod
+    def _record_price(session, product, new_price, first=False):
+        """Добавляет строку в историю, если цена действительно изменилась"""
+        if not new_price:
+            return
+
+        price = to_kopecks(new_price)
+        if not first and product.current_price and to_kopecks(product.current_price) == price:
+            return
+
+        session.add(PriceHistory(product_id=product.id, price=price))
 
     def update_product_price(self, product_id, new_price):
-        """Обновляет цену товара с сохранением предыдущей цены"""
-        product = self.session.query(Product).filter_by(id=product_id).first()
-        if product:
-            # Округляем цены
-            product.previous_price = round(product.current_price, 2) if product.current_price else new_price
-            product.current_price = round(new_price, 2)
-            product.last_check = datetime.utcnow()
-            self.session.commit()
-            return True
-        return False
+        """Обновляет цену товара с сохранением предыдущей цены (и историю, если цена изменилась)"""
+        with self.Session() as session:
+            product = session.query(Product).filter_by(id=product_id).first()
+            if product:
+                self._record_price(session, product, new_price)
+                # Округляем цены
+                product.previous_price = round(product.current_price, 2) if product.current_price else new_price
+                product.current_price = round(new_price, 2)
+                product.last_check = datetime.utcnow()
+                session.commit()
+                return True
+            return False
+
+    def schedule_product(self, product_id, next_check_at, check_interval):
+        """Сохраняет время следующей проверки товара и его интервал"""
+        with self.Session() as session:
+            session.query(Product).filter_by(id=product_id).update(
+                {'next_check_at': next_check_at, 'check_interval': check_interval},
+                synchronize_session=False
+            )
+            session.commit()
+
+    def claim_due_products(self, owner, limit, lease_seconds):
+        """Берёт в аренду до limit товаров, срок проверки которых наступил.
+
+        Товар достаётся только одному воркеру: аренда ставится условным UPDATE
+        (свободен или аренда истекла), поэтому два воркера, выбравшие одни и те
+        же товары, не проверят их дважды. Аренда упавшего воркера просто истекает.
+        """
+        now = datetime.utcnow()
+        until = now + timedelta(seconds=lease_seconds)
+        free = or_(Product.lease_until.is_(None), Product.lease_until < now)
+
+        with self.Session() as session:
+            # Если все выбранные товары перехватил другой воркер - выбираем заново
+            for _ in range(3):
+                candidates = session.query(Product.id).filter(
+                    or_(Product.next_check_at.is_(None), Product.next_check_at <= now),
+                    free,
+                ).order_by(Product.next_check_at).limit(limit)
+                if self.engine.dialect.name == 'postgresql':
+                    # Строки, которые сейчас забирает другой воркер, пропускаем, а не ждём
+                    candidates = candidates.with_for_update(skip_locked=True)
+                ids = [product_id for product_id, in candidates.all()]
+                if not ids:
+                    return []
+
+                claimed = session.query(Product).filter(Product.id.in_(ids), free).update(
+                    {'lease_owner': owner, 'lease_until': until},
+                    synchronize_session=False
+                )
+                session.commit()
+                if claimed:
+                    return session.query(Product).filter(
+                        Product.id.in_(ids),
+                        Product.lease_owner == owner,
+                        Product.lease_until == until,
+                    ).all()
+
+            return []
+
+    def renew_leases(self, owner, product_ids, lease_seconds):
+        """Продлевает аренду товаров, которые воркер ещё проверяет"""
+        with self.Session() as session:
+            renewed = session.query(Product).filter(
+                Product.id.in_(list(product_ids)),
+                Product.lease_owner == owner,
+            ).update(
+                {'lease_until': datetime.utcnow() + timedelta(seconds=lease_seconds)},
+                synchronize_session=False
+            )
+            session.commit()
+            return renewed
+
+    def release_product(self, product_id, owner, next_check_at=None, check_interval=None):
+        """Снимает аренду товара и, если передано, сохраняет время следующей проверки"""
+        values = {'lease_owner': None, 'lease_until': None}
+        if next_check_at is not None:
+            values.update(next_check_at=next_check_at, check_interval=check_interval)
+
+        with self.Session() as session:
+            session.query(Product).filter_by(id=product_id, lease_owner=owner).update(
+                values, synchronize_session=False
+            )
+            session.commit()
+
+    def release_leases(self, owner):
+        """Снимает все аренды воркера (при остановке), чтобы товары сразу достались другим"""
+        with self.Session() as session:
+            released = session.query(Product).filter_by(lease_owner=owner).update(
+                {'lease_owner': None, 'lease_until': None},
+                synchronize_session=False
+            )
+            session.commit()
+            return released
+
+    def set_test_prices(self, product_id, previous_price, current_price):
+        """Прямая установка цен товара для тестовых команд (без записи в историю)"""
+        with self.Session() as session:
+            product = session.query(Product).filter_by(id=product_id).first()
+            if product:
+                product.previous_price = previous_price
+                product.current_price = current_price
+                session.commit()
+                return True
+            return False
+
+    def compact_price_history(self, raw_days=None, daily_days=None):
+        """Прореживание истории цен.
+
+        Записи старше raw_days сворачиваются в дневные минимум/максимум,
+        дневные записи старше daily_days удаляются.
+        """
+        raw_days = raw_days if raw_days is not None else self.config.PRICE_HISTORY_RAW_DAYS
+        daily_days = daily_days if daily_days is not None else self.config.PRICE_HISTORY_DAILY_DAYS
+        cutoff = datetime.utcnow() - timedelta(days=raw_days)
+
+        with self.Session() as session:
+            day_column = func.date(PriceHistory.ts)
+            rows = session.query(
+                PriceHistory.product_id,
+                day_column,
+                func.min(PriceHistory.price),
+                func.max(PriceHistory.price),
+            ).filter(PriceHistory.ts < cutoff).group_by(PriceHistory.product_id, day_column).all()
+
+            for product_id, day, min_price, max_price in rows:
+                # SQLite возвращает дату строкой
+                if isinstance(day, str):
+                    day = date.fromisoformat(day)
+
+                daily = session.get(PriceHistoryDaily, (product_id, day))
+                if daily:
+                    daily.min_price = min(daily.min_price, min_price)
+                    daily.max_price = max(daily.max_price, max_price)
+                else:
+                    session.add(PriceHistoryDaily(
+                        product_id=product_id, day=day, min_price=min_price, max_price=max_price
+                    ))
+
+            raw_deleted = session.query(PriceHistory).filter(
+                PriceHistory.ts < cutoff
+            ).delete(synchronize_session=False)
+
+            daily_deleted = session.query(PriceHistoryDaily).filter(
+                PriceHistoryDaily.day < (datetime.utcnow() - timedelta(days=daily_days)).date()
+            ).delete(synchronize_session=False)
+
+            session.commit()
+            return raw_deleted, daily_deleted
 
     def add_user_product(self, user_id, product_id):
-        if not self.session.query(UserProduct).filter_by(
-                user_id=user_id, product_id=product_id
-        ).first():
-            user_product = UserProduct(user_id=user_id, product_id=product_id)
-            self.session.add(user_product)
-            self.session.commit()
+        """Подписка пользователя на товар (повторная подписка ничего не меняет)"""
+        with self.Session() as session:
+            dialect = self.engine.dialect.name
+            if dialect in ('sqlite', 'postgresql'):
+                insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+                session.execute(
+                    insert(UserProduct)
+                    .values(user_id=user_id, product_id=product_id)
+                    .on_conflict_do_nothing(index_elements=['user_id', 'product_id'])
+                )
+                session.commit()
+                return
+
+            try:
+                session.add(UserProduct(user_id=user_id, product_id=product_id))
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+
+    def remove_user_product(self, user_id, product_id):
+        """Отписка пользователя от товара; False, если подписки не было"""
+        with self.Session() as session:
+            deleted = session.query(UserProduct).filter_by(
+                user_id=user_id,
+                product_id=product_id
+            ).delete(synchronize_session=False)
+            session.commit()
+            return deleted > 0
+
+    def get_short_link(self, short_url):
+        """product_id, в который разворачивается короткая ссылка, или None"""
+        with self.Session() as session:
+            link = session.get(ShortLink, short_url)
+            return link.product_id if link else None
+
+    def save_short_link(self, short_url, product_id):
+        with self.Session() as session:
+            session.merge(ShortLink(short_url=short_url, product_id=product_id))
+            session.commit()
 
     def get_user_products(self, user_id):
-        return self.session.query(Product).join(
-            UserProduct, Product.id == UserProduct.product_id
-        ).filter(UserProduct.user_id == user_id).all()
+        with self.Session() as session:
+            return session.query(Product).join(
+                UserProduct, Product.id == UserProduct.product_id
+            ).filter(UserProduct.user_id == user_id).all()
+
+    def get_subscribers(self, product_ids):
+        """Подписчики набора товаров одним запросом: список пар (telegram_id, product)"""
+        product_ids = list(product_ids)
+        pairs = []
+
+        with self.Session() as session:
+            # Частями, чтобы не упереться в лимит параметров SQLite
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                pairs.extend(
+                    session.query(User.telegram_id, Product)
+                    .join(UserProduct, UserProduct.user_id == User.id)
+                    .join(Product, Product.id == UserProduct.product_id)
+                    .filter(Product.id.in_(chunk))
+                    .all()
+                )
+
+        return pairs
+
+    def get_subscriber_counts(self):
+        """Число подписчиков каждого товара: {product.id: count}"""
+        with self.Session() as session:
+            return dict(
+                session.query(UserProduct.product_id, func.count(UserProduct.id))
+                .group_by(UserProduct.product_id)
+                .all()
+            )
 
     def get_all_tracked_products(self):
-        return self.session.query(Product).all()
+        with self.Session() as session:
+            return session.query(Product).all()
 
     def get_product_by_name(self, name):
         """Найти товар по имени"""
-        return self.session.query(Product).filter(Product.name.like(f"%{name}%")).first()
+        with self.Session() as session:
+            return session.query(Product).filter(Product.name.like(f"%{name}%")).first()
 
     def create_test_price_change(self, product_id):
         """Создать искусственное изменение цены для теста"""
-        product = self.session.query(Product).filter_by(id=product_id).first()
-        if product and product.current_price > 0:
-            # Устанавливаем предыдущую цену на 10% ниже
-            product.previous_price = product.current_price * 0.9
-            self.session.commit()
-            return True
-        return False
\ No newline at end of file
+        with self.Session() as session:
+            product = session.query(Product).filter_by(id=product_id).first()
+            if product and product.current_price > 0:
+                # Устанавливаем предыдущую цену на 10% ниже
+                product.previous_price = product.current_price * 0.9
+                session.commit()
+                return True
+            return False
+
+
+class AsyncDatabase:
+    """Асинхронный доступ к базе для обработчиков и планировщика.
+
+    Любой метод Database вызывается как корутина и выполняется в отдельном
+    пуле потоков, поэтому медленный запрос или commit не блокирует event loop:
+        products = await db.get_user_products(user.id)
+    """
+
+    def __init__(self, db=None):
+        self.db = db or Database()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.db.config.DB_THREADS,
+            thread_name_prefix='db'
+        )
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            with DB_OPERATION_SECONDS.labels(name).time():
+                return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+        call.__name__ = name
+        return call
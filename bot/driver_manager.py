@@ -0,0 +1,309 @@
+# bot/driver_manager.py
+"""Общие на процесс браузеры Selenium.
+
+Все пулы парсеров (проверка цен, команды /add и /check) берут браузеры у
+одного DriverManager. Он следит за их жизненным циклом:
+
+* браузер, открывший BROWSER_MAX_PAGES страниц или занявший больше
+  BROWSER_MAX_RSS_MB памяти, заменяется свежим; замена запускается в фоне
+  заранее, и старый браузер работает, пока она не готова;
+* если сессия браузера умерла, он перезапускается, а запрос повторяется
+  один раз;
+* при старте браузеры можно запустить заранее (BROWSER_PREWARM), чтобы
+  первый запрос не ждал запуска Chrome;
+* запросы получают в первую очередь уже запущенные браузеры, поэтому
+  Chrome запускается только у стольких парсеров, сколько нужно нагрузке.
+
+При SELENIUM_TABS > 1 один браузер выдаётся сразу нескольким запросам -
+по одному на вкладку, и браузеров запускается во столько же раз меньше.
+"""
+import asyncio
+import logging
+import math
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import Config
+from .metrics import BROWSER_RESTARTS_TOTAL
+from .selenium_parser import OzonSeleniumParser
+
+try:
+    import psutil
+except ImportError:  # Без psutil замена по памяти отключена
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def browser_rss_mb(parser):
+    """Память браузера парсера вместе с дочерними процессами (рендереры, GPU), МБ.
+
+    Общие страницы процессов считаются несколько раз, так что это оценка сверху.
+    """
+    if psutil is None or not parser.driver:
+        return None
+
+    try:
+        process = psutil.Process(parser.driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+
+    total = 0
+    for child in processes:
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue  # Процесс успел завершиться
+    return total / 1024 / 1024
+
+
+class DriverManager:
+    """Браузеры, общие для всех пулов процесса"""
+
+    def __init__(self, max_pages=None, max_rss_mb=None, tabs=None):
+        self.max_pages = Config.BROWSER_MAX_PAGES if max_pages is None else max_pages
+        self.max_rss_mb = Config.BROWSER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.tabs = max(1, Config.SELENIUM_TABS if tabs is None else tabs)
+        self.parsers = []
+        # Места в очереди свободных браузеров: браузер с вкладками занимает несколько
+        self.slots = []
+        self._leases = Counter()  # Парсер -> сколько запросов им сейчас пользуются
+        self._successors = {}  # Заменённый парсер, ещё занятый запросами -> его замена
+        # Запуск замен и закрытие старых браузеров - в своих потоках, не в потоках пулов
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='browser-lifecycle')
+        self._idle = None
+        self._replacements = {}  # Парсер -> Future с уже запущенной заменой
+        self._rss = {}  # Парсер -> память браузера после последнего запроса, МБ
+
+        # Статистика жизненного цикла и трафик уже заменённых браузеров
+        self.restarts = {'pages': 0, 'rss': 0, 'dead': 0}
+        self._retired_traffic = {'pages': 0, 'bytes': 0}
+
+    def reserve(self, count, headless=True):
+        """Добавляет count мест (по одному на поток нового пула): браузеров или вкладок"""
+        browsers = math.ceil(count / self.tabs)
+        # Места поровну между браузерами, у каждого браузера - по вкладке на место
+        for index in range(browsers):
+            tabs = count // browsers + (index < count % browsers)
+            parser = OzonSeleniumParser(headless=headless, tabs=tabs)
+            self.parsers.append(parser)
+            self.slots.extend([parser] * tabs)
+            if self._idle is not None:
+                for _ in range(tabs):
+                    self._idle.put_nowait(parser)
+
+    def _idle_parsers(self):
+        # Очередь создаём лениво - внутри уже работающего event loop
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for parser in self.slots:
+                self._idle.put_nowait(parser)
+        return self._idle
+
+    async def acquire(self):
+        """Свободный браузер, по возможности уже запущенный; если для него готова замена - уже она"""
+        idle = self._idle_parsers()
+        parser = await idle.get()
+        if not parser.driver:
+            parser = self._prefer_running(idle, parser)
+
+        replacement = self._replacements.get(parser)
+        if replacement is not None and replacement.done():
+            del self._replacements[parser]
+            if not replacement.cancelled() and replacement.exception() is None:
+                parser = self._swap(parser, replacement.result())
+            else:
+                logger.error(f"Не удалось запустить замену браузера: {replacement.exception()}")
+
+        self._leases[parser] += 1
+        return parser
+
+    @staticmethod
+    def _prefer_running(idle, cold):
+        """Запущенный браузер из очереди вместо незапущенного cold.
+
+        Иначе очередь по кругу выдала бы каждое место, и со временем Chrome
+        запустился бы у всех зарезервированных парсеров, а не только у
+        нужных под текущую нагрузку (и прогретых prewarm).
+        """
+        found = None
+        for _ in range(idle.qsize()):
+            parser = idle.get_nowait()
+            if found is None and parser.driver:
+                found = parser
+            else:
+                idle.put_nowait(parser)
+
+        if found is None:
+            return cold
+        idle.put_nowait(cold)
+        return found
+
+    def release(self, parser):
+        """Возвращает браузер; при превышении лимитов заранее запускает его замену"""
+        self._leases[parser] -= 1
+        successor = self._successors.get(parser)
+        if successor is not None:
+            # Браузер уже заменён: закрываем, когда вернутся все его запросы, место отдаём замене
+            if not self._leases[parser]:
+                self._retire(parser)
+            self._idle_parsers().put_nowait(successor)
+            return
+
+        reason = self._recycle_reason(parser)
+        if reason and parser not in self._replacements:
+            logger.info(
+                f"Браузер открыл {parser.pages_since_start} страниц, память "
+                f"{self._rss.get(parser) or 0:.0f} МБ - запускаю замену ({reason})"
+            )
+            self.restarts[reason] += 1
+            BROWSER_RESTARTS_TOTAL.labels(reason).inc()
+            self._replacements[parser] = self.executor.submit(self._start_parser, parser.headless, parser.tabs)
+
+        self._idle_parsers().put_nowait(parser)
+
+    def call(self, parser, method, *args):
+        """Вызов метода парсера в потоке пула; упавший браузер перезапускается, вызов повторяется.
+
+        Методы парсера ловят ошибки сами и возвращают None, поэтому мёртвую
+        сессию распознаём уже после вызова.
+        """
+        result = getattr(parser, method)(*args)
+
+        if result is None and not parser.is_alive():
+            logger.warning(f"Сессия браузера потеряна, перезапускаю и повторяю {method}")
+            self.restarts['dead'] += 1
+            BROWSER_RESTARTS_TOTAL.labels('dead').inc()
+            parser.restart_driver()
+            result = getattr(parser, method)(*args)
+
+        if self.max_rss_mb:
+            self._rss[parser] = browser_rss_mb(parser)
+        return result
+
+    def _recycle_reason(self, parser):
+        if not parser.driver:
+            return None
+        if self.max_pages and parser.pages_since_start >= self.max_pages:
+            return 'pages'
+        rss = self._rss.get(parser)
+        if self.max_rss_mb and rss is not None and rss > self.max_rss_mb:
+            return 'rss'
+        return None
+
+    @staticmethod
+    def _start_parser(headless, tabs):
+        parser = OzonSeleniumParser(headless=headless, tabs=tabs)
+        parser.setup_driver()
+        return parser
+
+    def _swap(self, old, new):
+        """Ставит готовую замену на место старого браузера во всех его местах очереди"""
+        self.parsers[self.parsers.index(old)] = new
+        self.slots = [new if parser is old else parser for parser in self.slots]
+        idle = self._idle_parsers()
+        for _ in range(idle.qsize()):
+            parser = idle.get_nowait()
+            idle.put_nowait(new if parser is old else parser)
+        for retired, successor in self._successors.items():
+            if successor is old:
+                self._successors[retired] = new
+
+        # Другие вкладки старого браузера ещё могут загружаться - он закроется после них
+        if self._leases[old]:
+            self._successors[old] = new
+        else:
+            self._retire(old)
+        logger.info("Браузер заменён заранее запущенным")
+        return new
+
+    def _retire(self, parser):
+        """Закрывает заменённый браузер в фоне, его трафик остаётся в статистике"""
+        self._successors.pop(parser, None)
+        self._leases.pop(parser, None)
+        self._rss.pop(parser, None)
+        for key in self._retired_traffic:
+            self._retired_traffic[key] += parser.stats[key]
+        self.executor.submit(self._close_parser, parser)
+
+    @staticmethod
+    def _close_parser(parser):
+        try:
+            parser.close_driver()
+        except Exception as e:
+            logger.error(f"Ошибка закрытия драйвера: {e}")
+
+    @classmethod
+    def _close_replacement(cls, future):
+        if future.exception() is None:
+            cls._close_parser(future.result())
+
+    async def prewarm(self, count=None):
+        """Запускает ещё не запущенные браузеры (на count мест), пока они не понадобились"""
+        if not Config.BROWSER_PREWARM or 'selenium' not in Config.FETCH_TIERS:
+            return
+
+        # Пока браузер запускается, его места не выдаются запросам
+        idle = self._idle_parsers()
+        held = Counter()
+        for _ in range(idle.qsize()):
+            parser = idle.get_nowait()
+            if not parser.driver and (parser in held or count is None or sum(held.values()) < count):
+                held[parser] += 1
+            else:
+                idle.put_nowait(parser)
+        cold = list(held)
+
+        async def warm(parser):
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, parser.setup_driver)
+            except Exception as e:
+                logger.error(f"Не удалось заранее запустить браузер: {e}")
+            finally:
+                for _ in range(held[parser]):
+                    idle.put_nowait(parser)
+
+        if cold:
+            logger.info(f"Запускаю браузеров заранее: {len(cold)}")
+            await asyncio.gather(*(warm(parser) for parser in cold))
+
+    def stats(self):
+        """Запущенные браузеры, готовящиеся замены, причины перезапусков и загрузка вкладок"""
+        latency = [stats for parser in self.parsers for stats in parser.tab_latency.values()]
+        loads = sum(stats['loads'] for stats in latency)
+        return {
+            'size': len(self.parsers),
+            'running': sum(1 for parser in self.parsers if parser.driver),
+            'replacements': len(self._replacements),
+            'recycled_pages': self.restarts['pages'],
+            'recycled_rss': self.restarts['rss'],
+            'restarted_dead': self.restarts['dead'],
+            'tabs': self.tabs,
+            'tabs_in_flight': sum(parser.tab_stats['in_flight'] for parser in self.parsers),
+            'tab_loads': loads,
+            'tab_avg_latency': sum(stats['total'] for stats in latency) / loads if loads else 0.0,
+            'tab_max_latency': max((stats['max'] for stats in latency), default=0.0),
+        }
+
+    def traffic_stats(self):
+        """Страницы и байты всех браузеров процесса, включая уже заменённые"""
+        return {
+            key: self._retired_traffic[key] + sum(parser.stats[key] for parser in self.parsers)
+            for key in self._retired_traffic
+        }
+
+    def close(self):
+        """Закрывает все браузеры и готовые замены"""
+        for future in self._replacements.values():
+            # Уже запускающаяся замена закроется, как только запустится
+            if not future.cancel():
+                future.add_done_callback(self._close_replacement)
+        self._replacements.clear()
+
+        for parser in self.parsers + list(self._successors):
+            self._close_parser(parser)
+
+
+# Один набор браузеров на процесс
+driver_manager = DriverManager()
@@ -0,0 +1,106 @@
+# bot/fetcher.py
+import logging
+
+from .cache import product_cache
+from .config import Config
+from .links import ShortLinkResolver
+from .metrics import FETCHES_TOTAL, FETCH_SECONDS
+from .ozon_parser import AsyncOzonParser
+
+logger = logging.getLogger(__name__)
+
+
+class ProductFetcher:
+    """Многоуровневое получение информации о товаре.
+
+    Сначала пробуются дешёвые HTTP-методы AsyncOzonParser, браузер из пула
+    используется только если они не дали цену. Для каждого товара
+    запоминается метод, сработавший в прошлый раз, - повторная проверка
+    начинается сразу с него. Результаты кэшируются по product_id в общем
+    для процесса кэше (см. ProductInfoCache).
+    """
+
+    # Методы в порядке возрастания стоимости
+    TIERS = ('direct_html', 'graphql_api', 'mobile_api', 'selenium')
+
+    def __init__(self, pool, http_parser=None, cache=None, db=None):
+        self.pool = pool
+        self.config = Config()
+        self.http_parser = http_parser or AsyncOzonParser()
+        # Разрешённые методы (Config.FETCH_TIERS) в порядке стоимости
+        self.tiers = [tier for tier in self.TIERS if tier in self.config.FETCH_TIERS]
+        self.cache = cache or product_cache
+        # Короткие ссылки разворачиваются один раз и запоминаются в базе
+        self.links = ShortLinkResolver(self.http_parser, pool, db)
+        # product_id -> [метод, сколько раз подряд он использован]
+        self.last_tier = {}
+
+    def _tier_order(self, product_id):
+        """Порядок методов: сначала сработавший в прошлый раз, затем остальные по стоимости"""
+        remembered = self.last_tier.get(product_id)
+        if not remembered:
+            return list(self.tiers)
+
+        tier, uses = remembered
+        # Время от времени начинаем с самого дешёвого метода - вдруг он снова работает
+        if uses >= self.config.FETCH_TIER_REPROBE_EVERY:
+            remembered[1] = 0
+            return list(self.tiers)
+
+        return [tier] + [t for t in self.tiers if t != tier]
+
+    async def _fetch_tier(self, tier, url, product_id):
+        try:
+            with FETCH_SECONDS.labels(tier).time():
+                if tier == 'selenium':
+                    result = await self.pool.get_product_info(url)
+                else:
+                    result = await getattr(self.http_parser, f'_try_{tier}')(url, product_id)
+        except Exception as e:
+            logger.error(f"Ошибка метода {tier} для товара {product_id}: {e}")
+            FETCHES_TOTAL.labels(tier, 'error').inc()
+            return None
+
+        # ok - с ценой, no_price - только название, failed - ничего
+        outcome = 'ok' if result and result.get('price') else 'no_price' if result else 'failed'
+        FETCHES_TOTAL.labels(tier, outcome).inc()
+        return result
+
+    async def get_product_info(self, url):
+        """Получение информации о товаре самым дешёвым работающим методом"""
+        product_id = await self.links.extract_product_id(url)
+        if not product_id:
+            # Браузерный парсер умеет разбирать ссылки сам
+            if 'selenium' not in self.tiers:
+                return None
+            return await self._fetch_tier('selenium', url, None)
+
+        return await self.cache.get_or_fetch(product_id, lambda: self._fetch_tiers(url, product_id))
+
+    async def _fetch_tiers(self, url, product_id):
+        partial = None
+        for tier in self._tier_order(product_id):
+            result = await self._fetch_tier(tier, url, product_id)
+
+            if result and result.get('price'):
+                remembered = self.last_tier.get(product_id)
+                if remembered and remembered[0] == tier:
+                    remembered[1] += 1
+                else:
+                    self.last_tier[product_id] = [tier, 1]
+
+                result.setdefault('product_id', product_id)
+                result['fetch_method'] = tier
+                logger.debug(f"Товар {product_id} получен методом {tier}")
+                return result
+
+            # Запоминаем хотя бы название на случай, если цену не даст ни один метод
+            if result and partial is None:
+                partial = result
+
+        self.last_tier.pop(product_id, None)
+        return partial
+
+    async def close(self):
+        await self.http_parser.close()
+        self.pool.close()
@@ -1,18 +1,19 @@
 # bot/handlers.py
 from telegram import Update
 from telegram.ext import ContextTypes
-from .database import Database
-from .selenium_parser import OzonSeleniumParser
+from .cache import product_cache
+from .links import canonical_product_url
 from datetime import datetime
 
-db = Database()
-parser = OzonSeleniumParser(headless=True)  # Используем исправленный парсер
+# База (db), получение товаров (fetcher) и пулы браузеров создаёт PriceTrackerBot
+# и передаёт обработчикам через context.bot_data
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
+    db = context.bot_data['db']
     user = update.effective_user
-    db.add_user(user.id, user.username)
+    await db.add_user(user.id, user.username)
 
     welcome_text = f"""Привет, {user.first_name}! 👋
 
@@ -32,6 +33,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Добавление товара для отслеживания"""
+    db = context.bot_data['db']
+    fetcher = context.bot_data['fetcher']
     if not context.args:
         await update.message.reply_text(
             "Пожалуйста, укажите ссылку на товар Ozon.\n"
@@ -50,7 +53,7 @@ async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # Получаем информацию о товаре
-        product_info = parser.get_product_info(url)
+        product_info = await fetcher.get_product_info(url)
 
         if not product_info:
             await update.message.reply_text(
@@ -72,17 +75,22 @@ async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             price = product_info['price']
 
-        # Сохраняем товар в базу
-        product = db.add_product(
+        # Сохраняем товар в базу под канонической ссылкой: разные варианты
+        # ссылки на один товар (короткая, с параметрами, со slug) дают один товар
+        product_id = product_info.get('product_id') or 'unknown'
+        if product_id != 'unknown':
+            url = canonical_product_url(product_id)
+
+        product = await db.add_product(
             url=url,
-            product_id=product_info.get('product_id', 'unknown'),
+            product_id=product_id,
             name=product_info.get('name', 'Неизвестный товар'),
             price=price
         )
 
         # Связываем товар с пользователем
-        user = db.add_user(update.effective_user.id, update.effective_user.username)
-        db.add_user_product(user.id, product.id)
+        user = await db.add_user(update.effective_user.id, update.effective_user.username)
+        await db.add_user_product(user.id, product.id)
 
         if price > 0:
             availability = "✅ В наличии" if product_info.get('available', True) else "❌ Нет в наличии"
@@ -112,8 +120,9 @@ async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список отслеживаемых товаров"""
-    user = db.add_user(update.effective_user.id, update.effective_user.username)
-    products = db.get_user_products(user.id)
+    db = context.bot_data['db']
+    user = await db.add_user(update.effective_user.id, update.effective_user.username)
+    products = await db.get_user_products(user.id)
 
     if not products:
         await update.message.reply_text("У вас нет отслеживаемых товаров.\nДобавьте товар командой /add")
@@ -141,8 +150,9 @@ async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def remove_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Удаление товара из отслеживания"""
-    user = db.add_user(update.effective_user.id, update.effective_user.username)
-    products = db.get_user_products(user.id)
+    db = context.bot_data['db']
+    user = await db.add_user(update.effective_user.id, update.effective_user.username)
+    products = await db.get_user_products(user.id)
 
     if not products:
         await update.message.reply_text("У вас нет отслеживаемых товаров для удаления.")
@@ -172,18 +182,8 @@ async def remove_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Получаем товар для удаления
         product_to_remove = products[product_num - 1]
 
-        # Находим связь пользователя с товаром
-        from .database import UserProduct
-        user_product = db.session.query(UserProduct).filter_by(
-            user_id=user.id,
-            product_id=product_to_remove.id
-        ).first()
-
-        if user_product:
-            # Удаляем связь
-            db.session.delete(user_product)
-            db.session.commit()
-
+        # Удаляем связь пользователя с товаром
+        if await db.remove_user_product(user.id, product_to_remove.id):
             await update.message.reply_text(
                 f"✅ Товар удалён из отслеживания:\n"
                 f"📦 {product_to_remove.name}"
@@ -277,6 +277,52 @@ async def check_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(error_msg)
 """
 
+async def pool_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Состояние пулов браузеров: для подбора их размера"""
+    handler_pool = context.bot_data['handler_pool']
+    pools = [('Команды /add, /check', handler_pool)]
+    check_pool = context.bot_data.get('check_pool')
+    if check_pool:
+        pools.append(('Проверка цен', check_pool))
+
+    message = "🖥 Пулы браузеров:\n\n"
+    for title, pool in pools:
+        stats = pool.stats()
+        message += (
+            f"{title}:\n"
+            f"• Браузеров: {stats['busy']}/{stats['size']} заняты\n"
+            f"• В очереди: {stats['waiting']}\n"
+            f"• Запросов: {stats['requests']}\n"
+            f"• Ожидание: среднее {stats['avg_wait']:.1f} с, макс. {stats['max_wait']:.1f} с\n\n"
+        )
+
+    stats = handler_pool.manager.stats()
+    message += (
+        f"Браузеры процесса:\n"
+        f"• Запущено: {stats['running']}/{stats['size']}, готовится замен: {stats['replacements']}\n"
+        f"• Заменено по числу страниц: {stats['recycled_pages']}, по памяти: {stats['recycled_rss']}\n"
+        f"• Перезапущено после падения: {stats['restarted_dead']}\n"
+    )
+    if stats['tabs'] > 1:
+        message += (
+            f"• Вкладок в браузере: {stats['tabs']}, загружается сейчас: {stats['tabs_in_flight']}\n"
+            f"• Загрузка во вкладке: средняя {stats['tab_avg_latency']:.1f} с, "
+            f"макс. {stats['tab_max_latency']:.1f} с ({stats['tab_loads']} страниц)\n"
+        )
+    message += "\n"
+
+    stats = product_cache.stats()
+    message += (
+        f"Кэш товаров:\n"
+        f"• Товаров: {stats['size']}\n"
+        f"• Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+        f"объединено запросов: {stats['coalesced']}\n"
+        f"• Доля без загрузки: {stats['hit_rate'] * 100:.0f}%\n"
+    )
+
+    await update.message.reply_text(message)
+
+
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Справка"""
     help_text = """📚 Помощь по использованию бота:
@@ -290,6 +336,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 *Тестовые команды (для отладки):*
 /test_alert - Отправить тестовое оповещение
 /test_simulate - Имитация изменения цены
+/pool - Состояние пулов браузеров
 
 Пример добавления товара:
 /add https://www.ozon.ru/product/123456789/
@@ -338,12 +385,13 @@ async def test_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def simulate_price_change(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Симулировать изменение цены для тестирования оповещений"""
+    db = context.bot_data['db']
     try:
         user_id = update.effective_user.id
         await update.message.reply_text("🔧 Запускаю симуляцию изменения цены...")
 
-        user = db.add_user(user_id, update.effective_user.username)
-        products = db.get_user_products(user.id)
+        user = await db.add_user(user_id, update.effective_user.username)
+        products = await db.get_user_products(user.id)
 
         if not products:
             await update.message.reply_text("У вас нет товаров для тестирования.")
@@ -387,7 +435,7 @@ async def simulate_price_change(update: Update, context: ContextTypes.DEFAULT_TY
         # Устанавливаем тестовые значения
         product.previous_price = test_old_price
         product.current_price = current_price
-        db.session.commit()
+        await db.set_test_prices(product.id, test_old_price, current_price)
 
         await update.message.reply_text("✅ Тестовые значения установлены в базу")
 
@@ -415,7 +463,7 @@ async def simulate_price_change(update: Update, context: ContextTypes.DEFAULT_TY
         # ВАЖНО: ПОЛНОЕ ВОССТАНОВЛЕНИЕ исходных значений
         product.previous_price = saved_previous
         product.current_price = saved_current
-        db.session.commit()
+        await db.set_test_prices(product.id, saved_previous, saved_current)
 
         await update.message.reply_text(
             f"🔄 *Восстановлено исходное состояние:*\n\n"
@@ -431,7 +479,7 @@ async def simulate_price_change(update: Update, context: ContextTypes.DEFAULT_TY
             if 'product' in locals() and 'saved_previous' in locals():
                 product.previous_price = saved_previous
                 product.current_price = saved_current
-                db.session.commit()
+                await db.set_test_prices(product.id, saved_previous, saved_current)
         except:
             pass
 
@@ -457,8 +505,9 @@ def create_test_price_change(self, product_id):
 
 async def create_test_change(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Создать тестовое изменение цены в базе"""
-    user = db.add_user(update.effective_user.id, update.effective_user.username)
-    products = db.get_user_products(user.id)
+    db = context.bot_data['db']
+    user = await db.add_user(update.effective_user.id, update.effective_user.username)
+    products = await db.get_user_products(user.id)
 
     if not products:
         await update.message.reply_text("У вас нет товаров.")
@@ -472,7 +521,7 @@ async def create_test_change(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     # Создаем искусственное изменение
     product.previous_price = real_current * 0.8  # -20%
-    db.session.commit()
+    await db.set_test_prices(product.id, product.previous_price, product.current_price)
 
     await update.message.reply_text(
         f"✅ Создано тестовое изменение!\n\n"
@@ -486,12 +535,14 @@ async def create_test_change(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def check_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ручная проверка и отправка оповещений об изменении цен"""
-    user = db.add_user(update.effective_user.id, update.effective_user.username)
+    db = context.bot_data['db']
+    fetcher = context.bot_data['fetcher']
+    user = await db.add_user(update.effective_user.id, update.effective_user.username)
 
     await update.message.reply_text("⏳ Запускаю проверку цен для оповещений...")
 
     try:
-        user_products = db.get_user_products(user.id)
+        user_products = await db.get_user_products(user.id)
 
         if not user_products:
             await update.message.reply_text("У вас нет отслеживаемых товаров.")
@@ -506,7 +557,7 @@ async def check_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE
                 # 1. Получаем актуальную цену с Ozon
                 await update.message.reply_text(f"🔍 Проверяю: {product.name[:30]}...")
 
-                product_info = parser.get_product_info(product.url)
+                product_info = await fetcher.get_product_info(product.url)
 
                 if not product_info or product_info.get('price') is None:
                     debug_info.append(f"{product.name[:20]}: ❌ Не удалось получить цену")
@@ -524,7 +575,7 @@ async def check_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE
                 if old_price is None or old_price == 0:
                     # Первая проверка
                     debug_msg += " (первая проверка)"
-                    db.update_product_price(product.id, new_price)
+                    await db.update_product_price(product.id, new_price)
                 else:
                     # Рассчитываем процент изменения
                     change_percent = ((new_price - old_price) / old_price) * 100
@@ -551,7 +602,7 @@ async def check_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE
                         )
 
                         # Обновляем цену в базе
-                        db.update_product_price(product.id, new_price)
+                        await db.update_product_price(product.id, new_price)
 
                         notifications_sent += 1
                         changed_products.append(f"{product.name[:20]}: {old_price}₽ → {new_price}₽")
@@ -559,7 +610,7 @@ async def check_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE
                         debug_msg += " ✅ ОПОВЕЩЕНИЕ ОТПРАВЛЕНО"
                     else:
                         # Незначительное изменение, просто обновляем
-                        db.update_product_price(product.id, new_price)
+                        await db.update_product_price(product.id, new_price)
                         debug_msg += " (изменение < 1%)"
 
                 debug_info.append(debug_msg)
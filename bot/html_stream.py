@@ -0,0 +1,106 @@
+# bot/html_stream.py
+"""Потоковый поиск JSON-LD товара в HTML страницы.
+
+Страница товара Ozon весит сотни килобайт и больше, а для цены нужен один
+блок <script type="application/ld+json"> со schema.org Product. Сканер
+получает страницу кусками по мере загрузки, просматривает каждый кусок один
+раз и сообщает, как только блок Product разобран, - после этого загрузку
+можно прервать, не скачивая и не сканируя остаток страницы. Выигрыш есть,
+только если блок стоит в начале страницы; в конце страницы сканер лишь
+повторяет обычный разбор.
+
+Просмотр идёт по байтам (маркеры тегов - ASCII), декодируются только
+блоки JSON-LD и, если товар в них не нашёлся, страница целиком - один раз.
+"""
+import json
+import re
+
+# Размер куска при потоковом чтении ответа
+STREAM_CHUNK_SIZE = 16 * 1024
+
+LD_JSON_TAG_RE = re.compile(rb'<script[^>]*type=["\']?application/ld\+json["\']?[^>]*>', re.IGNORECASE)
+SCRIPT_OPEN = b'<script'
+SCRIPT_CLOSE = b'</script>'
+
+
+def find_ld_json_product(data):
+    """Объект schema.org Product из разобранного JSON-LD (объект, список или @graph)"""
+    if isinstance(data, dict):
+        if data.get('@type') == 'Product':
+            return data
+        data = data.get('@graph')
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict) and item.get('@type') == 'Product':
+                return item
+    return None
+
+
+class LdJsonScanner:
+    """Инкрементальный сканер HTML: ищет блок JSON-LD с товаром.
+
+    feed() принимает очередной кусок байт и возвращает объект Product, как
+    только он разобран. Прочитанные байты - единственный буфер: по нему
+    идёт поиск, и из него же html() отдаёт страницу для разбора без JSON-LD.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding or 'utf-8'
+        self._data = bytearray()
+        self._pos = 0  # До какого места страница уже просмотрена
+        self._block = None  # Начало содержимого открытого блока JSON-LD
+        self.product = None
+
+    @property
+    def received(self):
+        """Прочитано байт"""
+        return len(self._data)
+
+    def feed(self, chunk):
+        """Следующий кусок страницы; возвращает объект Product, если он уже найден"""
+        if self.product is None:
+            self._data += chunk
+            self._scan()
+        return self.product
+
+    def html(self):
+        """Прочитанная часть страницы"""
+        return self._data.decode(self.encoding, errors='replace')
+
+    def _scan(self):
+        data = self._data
+        while True:
+            if self._block is None:
+                start = data.find(SCRIPT_OPEN, self._pos)
+                if start == -1:
+                    # Конец прочитанного может оказаться началом тега
+                    self._pos = max(self._pos, len(data) - len(SCRIPT_OPEN) + 1)
+                    return
+
+                end = data.find(b'>', start)
+                if end == -1:
+                    self._pos = start  # Тег ещё не дочитан
+                    return
+
+                self._pos = end + 1
+                if LD_JSON_TAG_RE.match(data, start, end + 1):
+                    self._block = end + 1
+                continue
+
+            close = data.find(SCRIPT_CLOSE, self._pos)
+            if close == -1:
+                # Блок ещё не дочитан; уже просмотренное повторно не ищем
+                self._pos = max(self._pos, len(data) - len(SCRIPT_CLOSE) + 1)
+                return
+
+            block = data[self._block:close].decode(self.encoding, errors='replace')
+            self._pos = close + len(SCRIPT_CLOSE)
+            self._block = None
+
+            try:
+                product = find_ld_json_product(json.loads(block))
+            except ValueError:
+                continue
+            if product is not None:
+                self.product = product
+                return
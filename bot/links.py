@@ -0,0 +1,136 @@
+# bot/links.py
+"""Ссылки на товары Ozon: канонический вид и разворачивание коротких ссылок.
+
+Короткая ссылка (ozon.ru/t/...) разворачивается обычным HTTP-запросом по
+редиректам, браузер нужен только если это не удалось. Результат хранится
+в таблице short_links, поэтому каждая ссылка разворачивается один раз.
+"""
+import logging
+import re
+from urllib.parse import urlparse
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+SHORT_LINK_RE = re.compile(r'^/t/([\w-]+)')
+
+# ID товара в полной ссылке, в порядке приоритета
+PRODUCT_ID_PATTERNS = [re.compile(pattern) for pattern in (
+    r'/product/(\d+)/',  # /product/123456/
+    r'/product/[^/?#]*-(\d+)/?(?:[?#]|$)',  # /product/nazvanie-tovara-123456/?from=share
+    r'--(\d+)/?$',  # товар-123456/
+    r'[?&]productId=(\d+)',  # ?productId=123456
+    r'[?&]id=(\d+)',  # ?id=123456
+    r'/(\d+)/?$',  # /123456/
+)]
+
+
+def canonical_product_url(product_id):
+    """Единая ссылка на товар, под которой он хранится в базе"""
+    return f"{Config.OZON_BASE_URL}/product/{product_id}/"
+
+
+def product_id_from_url(url):
+    """ID товара из полной (не короткой) ссылки или None"""
+    for pattern in PRODUCT_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+
+    logger.info(f"Не удалось найти ID в URL: {url}")
+    return None
+
+
+def short_link_key(url):
+    """Нормализованная короткая ссылка (без схемы, www, параметров) или None, если ссылка не короткая"""
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    match = SHORT_LINK_RE.match(parsed.path)
+    if not match or not (host == 'ozon.ru' or host.endswith('.ozon.ru')):
+        return None
+    return f"{host}/t/{match.group(1)}"
+
+
+class ShortLinkResolver:
+    """Разворачивание коротких ссылок с памятью в процессе и в базе"""
+
+    def __init__(self, http_parser, pool=None, db=None):
+        """
+        :param http_parser: AsyncOzonParser - для запросов по ссылке
+        :param pool: ParserPool - запасной вариант через браузер
+        :param db: AsyncDatabase - постоянное хранилище (без него - только память процесса)
+        """
+        self.http_parser = http_parser
+        self.pool = pool
+        self.db = db
+        self._resolved = {}  # Ключ короткой ссылки -> product_id
+
+    async def extract_product_id(self, url):
+        """ID товара из любой ссылки Ozon, включая короткие"""
+        key = short_link_key(url)
+        if key is None:
+            return product_id_from_url(url.strip())
+        return await self.resolve(key, url)
+
+    async def resolve(self, key, url):
+        product_id = self._resolved.get(key)
+        if product_id:
+            return product_id
+
+        if self.db is not None:
+            try:
+                product_id = await self.db.get_short_link(key)
+            except Exception as e:
+                logger.error(f"Ошибка чтения короткой ссылки {key}: {e}")
+
+        if not product_id:
+            product_id = await self._follow_redirects(url)
+            if not product_id and self.pool is not None:
+                product_id = await self._resolve_in_browser(url)
+            if not product_id:
+                return None
+
+            if self.db is not None:
+                try:
+                    await self.db.save_short_link(key, product_id)
+                except Exception as e:
+                    logger.error(f"Ошибка сохранения короткой ссылки {key}: {e}")
+
+        self._resolved[key] = product_id
+        return product_id
+
+    def _product_id_from_final_url(self, url):
+        # Редирект мог остановиться на самой короткой ссылке - номер из неё не ID товара
+        if short_link_key(url) is not None:
+            return None
+        return product_id_from_url(url)
+
+    async def _follow_redirects(self, url):
+        # HEAD дешевле, но его отвергают некоторые фронтенды - тогда GET
+        for method in ('HEAD', 'GET'):
+            try:
+                response = await self.http_parser._request(method, url, follow_redirects=True)
+            except Exception as e:
+                logger.info(f"Редирект {method} для {url} не удался: {e}")
+                continue
+
+            product_id = self._product_id_from_final_url(str(response.url))
+            if product_id:
+                return product_id
+        return None
+
+    async def _resolve_in_browser(self, url):
+        try:
+            final_url = await self.pool.run('resolve_short_link', url)
+        except Exception as e:
+            logger.error(f"Ошибка разворачивания ссылки {url} в браузере: {e}")
+            return None
+        return self._product_id_from_final_url(final_url) if final_url else None
@@ -3,7 +3,6 @@ import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from datetime import datetime
 import asyncio
 
 from .config import Config
@@ -16,9 +15,14 @@ from .handlers import (start,
                        simulate_price_change,
                        test_alert,
                        simulate_price_change,
-                       create_test_change)
-from .database import Database
-from .selenium_parser import OzonSeleniumParser
+                       create_test_change,
+                       pool_stats)
+from .database import AsyncDatabase
+from .parser_pool import ParserPool
+from .fetcher import ProductFetcher
+from .notifier import NotificationDispatcher
+from .scheduler import CheckScheduler
+from .metrics import CHECKS_TOTAL, PRICE_CHANGES_TOTAL, start_metrics_server
 
 # Настройка логирования
 logging.basicConfig(
@@ -31,86 +35,189 @@ logger = logging.getLogger(__name__)
 class PriceTrackerBot:
     def __init__(self):
         self.config = Config()
-        self.db = Database()
-        self.parser = OzonSeleniumParser(headless=True)
+        # Запросы к базе выполняются в отдельных потоках и не блокируют бота
+        self.db = AsyncDatabase()
+        # Пул браузеров для параллельной проверки цен
+        self.pool = ParserPool(size=self.config.CHECK_WORKERS, headless=True)
+        # Сначала дешёвые HTTP-методы, браузер из пула - только при неудаче
+        self.fetcher = ProductFetcher(self.pool, db=self.db)
+        # Изменившиеся товары, ожидающие рассылки: product.id -> (product, старая цена, новая цена, %)
+        self._pending_alerts = {}
+        # Очередь исходящих уведомлений (создаётся вместе с приложением в run)
+        self.notifier = None
+        self.check_scheduler = None
+        self._scheduler_task = None
+        self._prewarm_task = None
+        self._check_running = False
 
     async def check_prices(self, application):
         """Проверка цен всех отслеживаемых товаров"""
+        if self._check_running:
+            logger.warning("Предыдущая проверка цен ещё идёт, пропускаю запуск")
+            return
+
+        self._check_running = True
+        try:
+            await self._check_all_prices(application)
+        finally:
+            self._check_running = False
+
+    async def _check_all_prices(self, application):
         logger.info("Начинаю проверку цен...")
 
-        products = self.db.get_all_tracked_products()
+        products = await self.db.get_all_tracked_products()
+        traffic_before = self.pool.traffic_stats()
+
+        # Ограниченная очередь перед пулом браузеров: каждый воркер берёт следующий товар,
+        # как только освободится его браузер
+        queue = asyncio.Queue(maxsize=self.config.CHECK_QUEUE_SIZE)
+        workers = [
+            asyncio.create_task(self._check_worker(queue, application))
+            for _ in range(self.pool.size)
+        ]
 
         for product in products:
-            try:
-                # Получаем актуальную информацию о товаре
-                product_info = self.parser.get_product_info(product.url)
-
-                if product_info and product_info.get('price'):
-                    new_price = product_info['price']
-                    old_price = product.current_price
-
-                    # Проверяем изменение цены
-                    if old_price and new_price != old_price:
-                        change_percent = ((new_price - old_price) / old_price) * 100
-
-                        # Если изменение больше порога - отправляем уведомления
-                        if abs(change_percent) >= self.config.PRICE_CHANGE_THRESHOLD:
-                            # Находим пользователей, которые отслеживают этот товар
-                            from .database import UserProduct
-
-                            user_products = self.db.session.query(UserProduct).filter_by(
-                                product_id=product.id
-                            ).all()
-
-                            for user_product in user_products:
-                                # Получаем пользователя
-                                from .database import User
-                                user = self.db.session.query(User).filter_by(id=user_product.user_id).first()
-
-                                if user:
-                                    message = (
-                                        f"📢 Изменение цены!\n\n"
-                                        f"📦 {product.name}\n"
-                                        f"Старая цена: {old_price}₽\n"
-                                        f"Новая цена: {new_price}₽\n"
-                                        f"Изменение: {'📈 +' if change_percent > 0 else '📉 '}{change_percent:.1f}%\n\n"
-                                        f"{product.url}"
-                                    )
-
-                                    try:
-                                        await application.bot.send_message(
-                                            chat_id=user.telegram_id,
-                                            text=message
-                                        )
-                                        logger.info(f"Отправлено уведомление пользователю {user.telegram_id}")
-                                    except Exception as e:
-                                        logger.error(f"Ошибка отправки сообщения: {e}")
-
-                    # Обновляем цену в базе
-                    product.previous_price = product.current_price
-                    product.current_price = new_price
-                    product.last_check = datetime.utcnow()
-                    self.db.session.commit()
-
-                    await asyncio.sleep(2)  # Задержка между запросами
+            await queue.put(product)
+
+        # По одному сигналу остановки на воркер
+        for _ in workers:
+            await queue.put(None)
 
+        await asyncio.gather(*workers)
+
+        # Остаток уведомлений, не набравший полного пакета; дайджесты отправляем сразу
+        await self._send_alerts(application)
+        self.notifier.flush()
+
+        logger.info(f"Проверка цен завершена, проверено товаров: {len(products)}")
+
+        stats = self.pool.stats()
+        logger.info(
+            f"Пул браузеров: запросов {stats['requests']}, "
+            f"ожидание среднее {stats['avg_wait']:.1f} с, макс. {stats['max_wait']:.1f} с"
+        )
+
+        traffic = self.pool.traffic_stats()
+        pages = traffic['pages'] - traffic_before['pages']
+        loaded = traffic['bytes'] - traffic_before['bytes']
+        logger.info(
+            f"Браузер загрузил {pages} страниц, {loaded / 1024 / 1024:.1f} МБ "
+            f"(в среднем {loaded / 1024 / max(pages, 1):.0f} КБ на страницу)"
+        )
+
+    async def _check_worker(self, queue, application):
+        """Воркер проверки цен: обрабатывает товары из очереди, пока не получит None"""
+        while True:
+            product = await queue.get()
+            if product is None:
+                return
+
+            try:
+                await self._check_product(product, application)
             except Exception as e:
                 logger.error(f"Ошибка при проверке товара {product.id}: {e}")
 
-        logger.info("Проверка цен завершена")
+            await asyncio.sleep(self.config.CHECK_REQUEST_DELAY)  # Задержка между запросами
+
+    async def _check_product(self, product, application):
+        """Проверка цены одного товара и рассылка уведомлений.
+
+        :return: True - цена изменилась, False - не изменилась, None - цену получить не удалось
+        """
+        changed = None
+
+        # Получаем актуальную информацию о товаре
+        product_info = await self.fetcher.get_product_info(product.url)
+
+        if product_info and product_info.get('price'):
+            new_price = product_info['price']
+            old_price = product.current_price
+
+            # Проверяем изменение цены
+            if old_price and new_price != old_price:
+                change_percent = ((new_price - old_price) / old_price) * 100
+
+                # Если изменение больше порога - копим уведомление для пакетной рассылки
+                if abs(change_percent) >= self.config.PRICE_CHANGE_THRESHOLD:
+                    self._pending_alerts[product.id] = (product, old_price, new_price, change_percent)
+
+            # Обновляем цену в базе (и историю цен, если цена изменилась)
+            await self.db.update_product_price(product.id, new_price)
+
+            # Объект товара может жить дольше одной проверки (адаптивное расписание)
+            changed = new_price != old_price
+            if changed:
+                PRICE_CHANGES_TOTAL.inc()
+            product.previous_price = old_price
+            product.current_price = new_price
+
+        CHECKS_TOTAL.labels('failed' if changed is None else 'changed' if changed else 'unchanged').inc()
+
+        if len(self._pending_alerts) >= self.config.ALERT_BATCH_SIZE:
+            await self._send_alerts(application)
+
+        return changed
+
+    async def _send_alerts(self, application):
+        """Передача накопленных изменений в очередь уведомлений: подписчики всех товаров - одним запросом"""
+        alerts, self._pending_alerts = self._pending_alerts, {}
+        if not alerts:
+            return
+
+        for telegram_id, product in await self.db.get_subscribers(list(alerts)):
+            _, old_price, new_price, change_percent = alerts[product.id]
+            # Отправкой и объединением в дайджест занимается диспетчер - проверка не ждёт Telegram
+            self.notifier.notify_change(telegram_id, product, old_price, new_price, change_percent)
 
     async def setup_scheduler(self, application):
         """Настройка планировщика"""
         scheduler = AsyncIOScheduler()
-        scheduler.add_job(
-            self.check_prices,
-            'interval',
-            seconds=self.config.CHECK_INTERVAL,
-            args=[application]
-        )
+
+        # Браузеры запускаются в фоне, пока они не понадобились; без своих проверок
+        # цен боту нужны только браузеры команд
+        self._prewarm_task = asyncio.create_task(self.pool.manager.prewarm(
+            self.config.HANDLER_WORKERS if self.config.EXTERNAL_WORKERS else None
+        ))
+
+        if self.config.EXTERNAL_WORKERS:
+            # Цены проверяют отдельные процессы bot.worker
+            logger.info("Проверка цен выполняется внешними воркерами")
+        elif self.config.SCHEDULE_MODE == 'interval':
+            # Все товары разом каждые CHECK_INTERVAL секунд
+            # Затянувшийся запуск не накапливает очередь пропущенных
+            scheduler.add_job(
+                self.check_prices,
+                'interval',
+                seconds=self.config.CHECK_INTERVAL,
+                args=[application],
+                max_instances=1,
+                coalesce=True
+            )
+        else:
+            # Свой срок проверки у каждого товара (adaptive) или свой слот в интервале (rolling)
+            self.check_scheduler = CheckScheduler(
+                self.db,
+                check=lambda product: self._check_product(product, application),
+                workers=self.pool.size,
+                on_tick=lambda: self._send_alerts(application),
+            )
+            self._scheduler_task = asyncio.create_task(self.check_scheduler.run())
+
+        # Раз в сутки прореживаем историю цен
+        scheduler.add_job(self.compact_price_history, 'interval', days=1)
         scheduler.start()
         logger.info("Планировщик запущен")
 
+    async def compact_price_history(self):
+        """Прореживание истории цен по политике хранения"""
+        try:
+            raw_deleted, daily_deleted = await self.db.compact_price_history()
+            logger.info(
+                f"История цен прорежена: свёрнуто записей {raw_deleted}, удалено дневных {daily_deleted}"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка прореживания истории цен: {e}")
+
     async def error_handler(self, update: Update, context):
         """Обработчик ошибок"""
         logger.error(f"Ошибка при обработке сообщения: {context.error}")
@@ -124,7 +231,25 @@ class PriceTrackerBot:
     def run(self):
         """Запуск бота"""
         # Создаем приложение
-        application = Application.builder().token(self.config.TELEGRAM_TOKEN).build()
+        # Обновления обрабатываются параллельно: пока один пользователь ждёт /add,
+        # остальные получают ответы
+        application = (
+            Application.builder()
+            .token(self.config.TELEGRAM_TOKEN)
+            .concurrent_updates(True)
+            .build()
+        )
+        start_metrics_server(self.config.METRICS_PORT)
+        # Одна база и один HTTP-клиент на процесс; у команд свой пул браузеров,
+        # чтобы /add не ждал в очереди за плановой проверкой цен
+        handler_pool = ParserPool(size=self.config.HANDLER_WORKERS, headless=True, name='handlers')
+        application.bot_data['db'] = self.db
+        application.bot_data['fetcher'] = ProductFetcher(
+            handler_pool, http_parser=self.fetcher.http_parser, db=self.db
+        )
+        application.bot_data['handler_pool'] = handler_pool
+        application.bot_data['check_pool'] = self.pool
+        self.notifier = NotificationDispatcher(application.bot)
 
         # Добавляем обработчики команд
         application.add_handler(CommandHandler("start", start))
@@ -138,6 +263,7 @@ class PriceTrackerBot:
         application.add_handler(CommandHandler("test_simulate", simulate_price_change))
         application.add_handler(CommandHandler("create_test", create_test_change))
         application.add_handler(CommandHandler("check", check_notifications))
+        application.add_handler(CommandHandler("pool", pool_stats))
 
         # Обработчик неизвестных команд
         application.add_handler(MessageHandler(filters.COMMAND, self.unknown_command))
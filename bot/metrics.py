@@ -0,0 +1,118 @@
+# bot/metrics.py
+"""Метрики в формате Prometheus.
+
+Гистограммы по этапам (загрузка страницы в браузере, ожидание готовности,
+извлечение данных, методы получения товара, операции и commit базы,
+отправка сообщений) и счётчики проверок, ошибок и уведомлений. Сервер
+метрик поднимается в процессе бота или воркера на METRICS_PORT.
+
+Без пакета prometheus_client метрики превращаются в заглушки, и бот
+работает как раньше.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:
+    Counter = Gauge = Histogram = start_http_server = None
+
+# Интервалы гистограмм (в секундах): от разбора в памяти до медленной загрузки страницы
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Размеры (в байтах)
+SIZE_BUCKETS = (16384, 65536, 131072, 262144, 524288, 1048576, 2097152, 4194304)
+
+
+class _NoopMetric:
+    """Заглушка метрики с тем же интерфейсом, если prometheus_client не установлен"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _histogram(name, documentation, labels=(), buckets=SLOW_BUCKETS):
+    if Histogram is None:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name, documentation, labels=()):
+    if Counter is None:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+
+def _gauge(name, documentation, labels=()):
+    if Gauge is None:
+        return _NoopMetric()
+    return Gauge(name, documentation, labels)
+
+
+# Браузер
+DRIVER_GET_SECONDS = _histogram('ozon_driver_get_seconds', 'Время driver.get страницы товара')
+PAGE_WAIT_SECONDS = _histogram('ozon_page_wait_seconds', 'Ожидание готовности страницы после driver.get')
+# Режим вкладок (SELENIUM_TABS > 1): загрузки, идущие сейчас, и время загрузки по номеру вкладки
+TABS_IN_FLIGHT = _gauge('browser_tabs_in_flight', 'Вкладки, в которых сейчас загружается страница')
+TAB_LOAD_SECONDS = _histogram('browser_tab_load_seconds', 'Загрузка страницы во вкладке до извлечения', ['tab'])
+BROWSER_RESTARTS_TOTAL = _counter(
+    'browser_restarts_total', 'Замены и перезапуски браузеров по причине (pages, rss, dead)', ['reason']
+)
+
+# Извлечение данных из уже загруженной страницы или ответа, по методу
+EXTRACTION_SECONDS = _histogram(
+    'ozon_extraction_seconds', 'Извлечение названия и цены', ['method'], buckets=FAST_BUCKETS
+)
+
+# Сколько байт страницы прочитал direct_html до JSON-LD товара (или до конца страницы)
+DIRECT_HTML_BYTES = _histogram('ozon_direct_html_bytes', 'Прочитано байт страницы в direct_html', buckets=SIZE_BUCKETS)
+
+# Методы получения товара целиком (запрос и разбор)
+FETCH_SECONDS = _histogram('ozon_fetch_seconds', 'Получение товара методом', ['method'])
+FETCHES_TOTAL = _counter('ozon_fetches_total', 'Попытки получения товара по методу и исходу', ['method', 'result'])
+
+# Проверки цен
+CHECKS_TOTAL = _counter('price_checks_total', 'Проверки цен по исходу', ['result'])
+PRICE_CHANGES_TOTAL = _counter('price_changes_total', 'Изменения цены, найденные проверками')
+
+# База данных
+DB_OPERATION_SECONDS = _histogram(
+    'db_operation_seconds', 'Операции с базой (включая ожидание потока)', ['operation'], buckets=FAST_BUCKETS
+)
+DB_COMMIT_SECONDS = _histogram('db_commit_seconds', 'Время commit', buckets=FAST_BUCKETS)
+
+# Уведомления
+SEND_MESSAGE_SECONDS = _histogram('telegram_send_message_seconds', 'Время вызова send_message')
+NOTIFICATIONS_TOTAL = _counter('notifications_total', 'Уведомления по исходу отправки', ['result'])
+
+
+def start_metrics_server(port):
+    """Поднимает HTTP-эндпоинт /metrics на порту port (0 - не поднимать)"""
+    if not port:
+        return False
+    if start_http_server is None:
+        logger.warning("METRICS_PORT задан, но пакет prometheus_client не установлен - метрики отключены")
+        return False
+
+    start_http_server(port)
+    logger.info(f"Метрики Prometheus доступны на порту {port}")
+    return True
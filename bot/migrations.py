@@ -0,0 +1,162 @@
+# bot/migrations.py
+"""Лёгкие миграции схемы при запуске.
+
+create_all создаёт только отсутствующие таблицы, поэтому изменения уже
+существующих таблиц (индексы, ограничения, новые колонки) описываются
+здесь. Номер последней применённой миграции хранится в таблице
+schema_version.
+
+Бот и воркеры стартуют одновременно, поэтому схема обновляется под
+блокировкой (BEGIN IMMEDIATE в SQLite, advisory lock в PostgreSQL), а
+версия схемы перечитывается уже под ней.
+"""
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text
+
+from .links import canonical_product_url
+
+logger = logging.getLogger(__name__)
+
+
+def _user_products_constraints(conn, metadata):
+    """Уникальная пара (user_id, product_id), внешние ключи и индекс по product_id"""
+    # Дубликаты и "висячие" связи не дадут создать ограничения
+    conn.execute(text(
+        "DELETE FROM user_products WHERE id NOT IN "
+        "(SELECT MIN(id) FROM user_products GROUP BY user_id, product_id)"
+    ))
+    conn.execute(text(
+        "DELETE FROM user_products WHERE user_id NOT IN (SELECT id FROM users) "
+        "OR product_id NOT IN (SELECT id FROM products)"
+    ))
+
+    table = metadata.tables['user_products']
+
+    if conn.dialect.name == 'sqlite':
+        # SQLite не умеет добавлять ограничения - пересоздаём таблицу
+        conn.execute(text("ALTER TABLE user_products RENAME TO user_products_old"))
+        table.create(conn)
+        conn.execute(text(
+            "INSERT INTO user_products (id, user_id, product_id, created_at) "
+            "SELECT id, user_id, product_id, created_at FROM user_products_old"
+        ))
+        conn.execute(text("DROP TABLE user_products_old"))
+    else:
+        conn.execute(text(
+            "ALTER TABLE user_products ADD CONSTRAINT uq_user_products_user_product "
+            "UNIQUE (user_id, product_id)"
+        ))
+        conn.execute(text(
+            "ALTER TABLE user_products ADD CONSTRAINT fk_user_products_user "
+            "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+        ))
+        conn.execute(text(
+            "ALTER TABLE user_products ADD CONSTRAINT fk_user_products_product "
+            "FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE"
+        ))
+        for index in table.indexes:
+            index.create(conn)
+
+
+def _products_schedule_columns(conn, metadata):
+    """Колонки адаптивного расписания проверок в products"""
+    conn.execute(text("ALTER TABLE products ADD COLUMN next_check_at TIMESTAMP"))
+    conn.execute(text("ALTER TABLE products ADD COLUMN check_interval INTEGER"))
+    conn.execute(text("CREATE INDEX ix_products_next_check_at ON products (next_check_at)"))
+
+
+def _products_lease_columns(conn, metadata):
+    """Колонки аренды товаров воркерами в products"""
+    conn.execute(text("ALTER TABLE products ADD COLUMN lease_owner VARCHAR"))
+    conn.execute(text("ALTER TABLE products ADD COLUMN lease_until TIMESTAMP"))
+
+
+def _canonical_product_urls(conn, metadata):
+    """Единый вид ссылок на товары (короткие и длинные ссылки -> /product/<id>/)"""
+    rows = conn.execute(text("SELECT id, product_id FROM products")).all()
+    for row_id, product_id in rows:
+        if product_id and product_id.isdigit():
+            conn.execute(
+                text("UPDATE products SET url = :url WHERE id = :id"),
+                {'url': canonical_product_url(product_id), 'id': row_id}
+            )
+
+
+# Миграции в порядке применения: (версия, функция)
+MIGRATIONS = [
+    (1, _user_products_constraints),
+    (2, _products_schedule_columns),
+    (3, _products_lease_columns),
+    (4, _canonical_product_urls),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Ключ advisory lock PostgreSQL для миграций (любое число, общее для всех процессов)
+MIGRATION_LOCK_KEY = 732901
+
+
+def _get_version(conn):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def _set_version(conn, version):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {'version': version})
+
+
+@contextmanager
+def _migration_lock(conn):
+    """Транзакция, в которой схему обновляет только один процесс"""
+    if conn.dialect.name == 'sqlite':
+        # Драйвер открывает отложенную транзакцию сам; IMMEDIATE сразу берёт блокировку записи
+        # (ждёт её до timeout соединения), поэтому транзакцией управляем вручную
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+        return
+
+    with conn.begin():
+        if conn.dialect.name == 'postgresql':
+            # Снимается вместе с транзакцией
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        yield
+
+
+def migrate(engine, metadata):
+    """Создаёт схему и применяет недостающие миграции"""
+    sqlite = engine.dialect.name == 'sqlite'
+    options = {'isolation_level': 'AUTOCOMMIT'} if sqlite else {}
+
+    with engine.connect().execution_options(**options) as conn:
+        if sqlite:
+            # Пересоздание таблиц в SQLite требует выключенных внешних ключей
+            conn.execute(text("PRAGMA foreign_keys=OFF"))
+
+        with _migration_lock(conn):
+            # Состояние схемы читаем под блокировкой: его мог только что обновить другой процесс
+            fresh = not inspect(conn).has_table('products')
+            metadata.create_all(conn)
+
+            if fresh:
+                # Новая база сразу создана по актуальным моделям
+                _set_version(conn, LATEST_VERSION)
+            else:
+                version = _get_version(conn)
+                for number, migration in MIGRATIONS:
+                    if number > version:
+                        logger.info(f"Применяю миграцию схемы {number}: {migration.__doc__}")
+                        migration(conn, metadata)
+                        _set_version(conn, number)
+
+        if sqlite:
+            conn.execute(text("PRAGMA foreign_keys=ON"))
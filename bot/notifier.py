@@ -0,0 +1,229 @@
+# bot/notifier.py
+import asyncio
+import logging
+import time
+
+from telegram import Bot
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+
+from .config import Config
+from .metrics import NOTIFICATIONS_TOTAL, SEND_MESSAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def create_bot(token, base_url=None):
+    """Bot для отправки уведомлений вне Application (воркеры, нагрузочный тест).
+
+    У Bot по умолчанию одно HTTP-соединение - отправители NOTIFY_SENDERS
+    ждали бы друг друга, поэтому пул соединений подбирается под них.
+    """
+    kwargs = {'base_url': base_url} if base_url else {}
+    return Bot(token, request=HTTPXRequest(connection_pool_size=Config.NOTIFY_SENDERS), **kwargs)
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate операций в секунду с запасом capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Берёт токен; возвращает 0 или сколько секунд подождать до следующего"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            delay = self.take()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+
+class NotificationDispatcher:
+    """Очередь исходящих уведомлений о ценах.
+
+    Проверка цен только кладёт изменения в очередь и сразу идёт дальше,
+    отправкой занимаются отдельные задачи. Соблюдаются общий лимит Telegram
+    (NOTIFY_GLOBAL_RATE сообщений в секунду) и лимит на один чат, после
+    RetryAfter отправка ставится на паузу. Изменения для одного пользователя,
+    пришедшие в течение NOTIFY_DIGEST_WINDOW секунд, объединяются в одно
+    сообщение-дайджест.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.config = Config()
+        self._bucket = TokenBucket(self.config.NOTIFY_GLOBAL_RATE)
+        self._chat_ready = {}  # chat_id -> когда в этот чат снова можно писать
+        self._paused_until = 0.0  # Пауза после RetryAfter
+        self._queue = None
+        self._senders = []
+
+        self._digests = {}  # chat_id -> список изменений
+        self._digest_timers = {}  # chat_id -> таймер отправки дайджеста
+
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'retries': 0}
+
+    def _ensure_started(self):
+        # Очередь и задачи создаём лениво - внутри работающего event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._senders = [
+                asyncio.create_task(self._sender())
+                for _ in range(self.config.NOTIFY_SENDERS)
+            ]
+        return self._queue
+
+    def notify_change(self, chat_id, product, old_price, new_price, change_percent):
+        """Добавляет изменение цены в дайджест пользователя (без ожидания отправки)"""
+        self._ensure_started()
+        changes = self._digests.setdefault(chat_id, [])
+        changes.append((product.name, product.url, old_price, new_price, change_percent))
+
+        if chat_id not in self._digest_timers:
+            loop = asyncio.get_running_loop()
+            self._digest_timers[chat_id] = loop.call_later(
+                self.config.NOTIFY_DIGEST_WINDOW, self._flush_chat, chat_id
+            )
+
+    def flush(self):
+        """Немедленно ставит в очередь все накопленные дайджесты (например, в конце проверки)"""
+        for chat_id in list(self._digests):
+            self._flush_chat(chat_id)
+
+    def _flush_chat(self, chat_id):
+        timer = self._digest_timers.pop(chat_id, None)
+        if timer:
+            timer.cancel()
+
+        changes = self._digests.pop(chat_id, None)
+        if changes:
+            self.send(chat_id, self._format_digest(changes))
+
+    def send(self, chat_id, text, **kwargs):
+        """Ставит готовое сообщение в очередь отправки"""
+        self._ensure_started().put_nowait((chat_id, text, kwargs, 0))
+        self.stats['queued'] += 1
+
+    @staticmethod
+    def _format_digest(changes):
+        def change_line(old_price, new_price, change_percent):
+            return (
+                f"Старая цена: {old_price}₽\n"
+                f"Новая цена: {new_price}₽\n"
+                f"Изменение: {'📈 +' if change_percent > 0 else '📉 '}{change_percent:.1f}%\n"
+            )
+
+        if len(changes) == 1:
+            name, url, old_price, new_price, change_percent = changes[0]
+            return (
+                f"📢 Изменение цены!\n\n"
+                f"📦 {name}\n"
+                f"{change_line(old_price, new_price, change_percent)}\n"
+                f"{url}"
+            )
+
+        message = f"📢 Изменились цены на {len(changes)} товаров!\n"
+        for name, url, old_price, new_price, change_percent in changes:
+            message += (
+                f"\n📦 {name}\n"
+                f"{change_line(old_price, new_price, change_percent)}"
+                f"{url}\n"
+            )
+        return message
+
+    def _requeue(self, item, delay):
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, item)
+
+    async def _sender(self):
+        while True:
+            item = await self._queue.get()
+            chat_id, text, kwargs, attempt = item
+
+            # Чат ещё "остывает" - откладываем сообщение, не задерживая остальные
+            now = time.monotonic()
+            ready_at = self._chat_ready.get(chat_id, 0.0)
+            if ready_at > now:
+                self._requeue(item, ready_at - now)
+                continue
+
+            # Занимаем слот чата до первого await: другие отправители, пока этот ждёт
+            # паузы или токена, отложат сообщения в тот же чат
+            interval = self.config.NOTIFY_PER_CHAT_INTERVAL
+            self._chat_ready[chat_id] = now + interval
+
+            pause = self._paused_until - now
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            await self._bucket.acquire()
+            # Интервал отсчитывается от фактической отправки
+            self._chat_ready[chat_id] = max(self._chat_ready[chat_id], time.monotonic() + interval)
+
+            try:
+                with SEND_MESSAGE_SECONDS.time():
+                    await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                self.stats['sent'] += 1
+                NOTIFICATIONS_TOTAL.labels('sent').inc()
+                logger.info(f"Отправлено уведомление пользователю {chat_id}")
+            except RetryAfter as e:
+                # Telegram просит подождать - приостанавливаем всю отправку
+                self._paused_until = time.monotonic() + e.retry_after
+                self.stats['retries'] += 1
+                NOTIFICATIONS_TOTAL.labels('retry_after').inc()
+                logger.warning(f"Telegram просит подождать {e.retry_after} с")
+                self._requeue(item, e.retry_after)
+            except (Forbidden, BadRequest) as e:
+                # Пользователь заблокировал бота или сообщение некорректно - повтор не поможет
+                self.stats['failed'] += 1
+                NOTIFICATIONS_TOTAL.labels('rejected').inc()
+                logger.error(f"Уведомление пользователю {chat_id} не доставлено: {e}")
+            except TelegramError as e:
+                if attempt + 1 < self.config.NOTIFY_MAX_ATTEMPTS:
+                    self.stats['retries'] += 1
+                    NOTIFICATIONS_TOTAL.labels('retry').inc()
+                    self._requeue((chat_id, text, kwargs, attempt + 1), 2 ** attempt)
+                else:
+                    self.stats['failed'] += 1
+                    NOTIFICATIONS_TOTAL.labels('failed').inc()
+                    logger.error(f"Ошибка отправки сообщения: {e}")
+            except Exception as e:
+                self.stats['failed'] += 1
+                NOTIFICATIONS_TOTAL.labels('failed').inc()
+                logger.error(f"Ошибка отправки сообщения: {e}")
+
+            self._forget_idle_chats()
+
+    def _forget_idle_chats(self):
+        # Не держим в памяти чаты, в которые уже можно писать
+        if len(self._chat_ready) > 10000:
+            now = time.monotonic()
+            self._chat_ready = {
+                chat_id: ready_at for chat_id, ready_at in self._chat_ready.items() if ready_at > now
+            }
+
+    def pending(self):
+        """Сообщений в очереди и пользователей с ещё не отправленным дайджестом"""
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'digests': len(self._digests),
+        }
+
+    async def stop(self):
+        for task in self._senders:
+            task.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        self._senders = []
+        self._queue = None
@@ -1,9 +1,35 @@
+import asyncio
 import requests
+import httpx
 import re
 import json
 import time
 from urllib.parse import urlparse
 from .config import Config
+from .html_stream import STREAM_CHUNK_SIZE, LdJsonScanner, find_ld_json_product
+from .links import canonical_product_url, product_id_from_url
+from .metrics import DIRECT_HTML_BYTES, EXTRACTION_SECONDS
+from .widget_states import product_from_states, states_from_json
+
+# Заголовки, как у реального браузера
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Cache-Control': 'max-age=0',
+    'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+}
+
+GRAPHQL_URL = f"{Config.OZON_BASE_URL}/api/entrypoint-api.bx/graphql"
+MOBILE_API_URL = f"{Config.OZON_API_URL}/composer-api.bx/_action/productDetailV2"
 
 
 class OzonParser:
@@ -12,21 +38,7 @@ class OzonParser:
         self.session = requests.Session()
 
         # Более полные заголовки, как у реального браузера
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Cache-Control': 'max-age=0',
-            'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-        })
+        self.session.headers.update(BROWSER_HEADERS)
 
         # Устанавливаем таймауты
         self.timeout = 15
@@ -49,24 +61,7 @@ class OzonParser:
             except Exception as e:
                 print(f"Ошибка редиректа: {e}")
 
-        # Паттерны для поиска ID
-        patterns = [
-            r'/product/(\d+)/',  # /product/123456/
-            r'--(\d+)/?$',  # товар-123456/
-            r'[?&]productId=(\d+)',  # ?productId=123456
-            r'[?&]id=(\d+)',  # ?id=123456
-            r'/(\d+)/?$',  # /123456/
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                product_id = match.group(1)
-                print(f"Найден ID: {product_id} по паттерну {pattern}")
-                return product_id
-
-        print(f"Не удалось найти ID в URL: {url}")
-        return None
+        return product_id_from_url(url)
 
     def get_product_info(self, url):
         """Основной метод получения информации о товаре"""
@@ -103,7 +98,10 @@ class OzonParser:
         """Прямой парсинг HTML страницы"""
         try:
             # Используем полную ссылку с ID
-            full_url = f"https://www.ozon.ru/product/{product_id}/"
+            full_url = canonical_product_url(product_id)
+
+            if self.config.HTTP_STREAM_HTML:
+                return self._stream_direct_html(product_id, full_url)
 
             response = self.session.get(
                 full_url,
@@ -115,206 +113,241 @@ class OzonParser:
                 print(f"HTTP {response.status_code} для {full_url}")
                 return None
 
-            html = response.text
+            return self._parse_direct_html(response.text, product_id, full_url)
 
-            # Ищем данные в JSON-LD формате (самый надёжный способ)
-            json_ld_pattern = r'<script type="application/ld\+json">(.*?)</script>'
-            json_ld_matches = re.findall(json_ld_pattern, html, re.DOTALL)
-
-            for json_ld in json_ld_matches:
-                try:
-                    data = json.loads(json_ld)
-                    if data.get('@type') == 'Product':
-                        name = data.get('name', 'Неизвестный товар')
-
-                        # Пытаемся получить цену
-                        offers = data.get('offers', {})
-                        price = None
-
-                        if isinstance(offers, dict):
-                            price_str = offers.get('price')
-                            if price_str:
-                                try:
-                                    price = float(price_str)
-                                except:
-                                    pass
-
-                        if price:
-                            return {
-                                'product_id': product_id,
-                                'name': name,
-                                'price': price,
-                                'url': full_url
-                            }
-                        else:
-                            # Хотя бы возвращаем название
-                            return {
-                                'product_id': product_id,
-                                'name': name,
-                                'price': None,
-                                'url': full_url
-                            }
-                except json.JSONDecodeError:
-                    continue
+        except Exception as e:
+            print(f"Ошибка в _try_direct_html: {e}")
 
-            # Если JSON-LD не нашли, ищем в HTML
-            name = self._extract_name_from_html(html)
-            price = self._extract_price_from_html(html)
+        return None
 
-            if name:
-                return {
-                    'product_id': product_id,
-                    'name': name,
-                    'price': price,
-                    'url': full_url
-                }
+    def _stream_direct_html(self, product_id, full_url):
+        """Потоковая загрузка страницы: чтение прекращается, как только разобран JSON-LD товара"""
+        with self.session.get(full_url, timeout=self.timeout, allow_redirects=True, stream=True) as response:
+            if response.status_code != 200:
+                print(f"HTTP {response.status_code} для {full_url}")
+                return None
 
-        except Exception as e:
-            print(f"Ошибка в _try_direct_html: {e}")
+            scanner = LdJsonScanner(response.encoding)
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                if scanner.feed(chunk) is not None:
+                    break
+
+        return self._finish_direct_html(scanner, product_id, full_url)
+
+    def _finish_direct_html(self, scanner, product_id, full_url):
+        """Результат потокового чтения: товар из JSON-LD или запасной разбор прочитанной страницы"""
+        DIRECT_HTML_BYTES.observe(scanner.received)
+        if scanner.product is not None:
+            print(f"JSON-LD найден после {scanner.received / 1024:.0f} КБ страницы")
+            return self._product_from_ld_json(scanner.product, product_id, full_url)
+        # Все блоки JSON-LD сканер уже разобрал - повторно их не ищем
+        return self._parse_html_without_ld_json(scanner.html(), product_id, full_url)
+
+    @staticmethod
+    def _product_from_ld_json(data, product_id, full_url):
+        """Результат из объекта schema.org Product (без цены - хотя бы с названием)"""
+        name = data.get('name', 'Неизвестный товар')
+
+        # Пытаемся получить цену
+        offers = data.get('offers', {})
+        price = None
+
+        if isinstance(offers, dict):
+            price_str = offers.get('price')
+            if price_str:
+                try:
+                    price = float(price_str)
+                except (TypeError, ValueError):
+                    pass
+
+        return {
+            'product_id': product_id,
+            'name': name,
+            'price': price or None,
+            'url': full_url
+        }
+
+    def _parse_direct_html(self, html, product_id, full_url):
+        """Разбор HTML страницы товара: JSON-LD, затем регулярные выражения"""
+        # Ищем данные в JSON-LD формате (самый надёжный способ)
+        json_ld_pattern = r'<script type="application/ld\+json">(.*?)</script>'
+        json_ld_matches = re.findall(json_ld_pattern, html, re.DOTALL)
+
+        for json_ld in json_ld_matches:
+            try:
+                data = find_ld_json_product(json.loads(json_ld))
+            except json.JSONDecodeError:
+                continue
+            if data is not None:
+                return self._product_from_ld_json(data, product_id, full_url)
+
+        return self._parse_html_without_ld_json(html, product_id, full_url)
+
+    def _parse_html_without_ld_json(self, html, product_id, full_url):
+        """Название и цена регулярными выражениями - если JSON-LD товара на странице нет"""
+        name = self._extract_name_from_html(html)
+        price = self._extract_price_from_html(html)
+
+        if name:
+            return {
+                'product_id': product_id,
+                'name': name,
+                'price': price,
+                'url': full_url
+            }
 
         return None
 
-    def _try_graphql_api(self, url, product_id):
-        """Попытка через GraphQL API Ozon"""
-        try:
-            graphql_url = "https://www.ozon.ru/api/entrypoint-api.bx/graphql"
-
-            # GraphQL запрос для получения данных товара
-            graphql_query = {
-                "query": """
-                query GetProduct($productId: ID!) {
-                    product(id: $productId) {
-                        id
-                        title
-                        price {
-                            price
-                            formattedPrice
-                        }
+    def _graphql_request(self, product_id):
+        """Тело и заголовки GraphQL запроса для получения данных товара"""
+        graphql_query = {
+            "query": """
+            query GetProduct($productId: ID!) {
+                product(id: $productId) {
+                    id
+                    title
+                    price {
+                        price
+                        formattedPrice
                     }
                 }
-                """,
-                "variables": {
-                    "productId": product_id
-                },
-                "operationName": "GetProduct"
             }
+            """,
+            "variables": {
+                "productId": product_id
+            },
+            "operationName": "GetProduct"
+        }
+
+        headers = {
+            'Content-Type': 'application/json',
+            'Origin': Config.OZON_BASE_URL,
+            'Referer': canonical_product_url(product_id),
+            'x-o3-app-name': 'website',
+        }
+
+        return graphql_query, headers
 
-            headers = {
-                **self.session.headers,
-                'Content-Type': 'application/json',
-                'Origin': 'https://www.ozon.ru',
-                'Referer': f'https://www.ozon.ru/product/{product_id}/',
-                'x-o3-app-name': 'website',
-            }
+    def _try_graphql_api(self, url, product_id):
+        """Попытка через GraphQL API Ozon"""
+        try:
+            graphql_query, headers = self._graphql_request(product_id)
 
             response = self.session.post(
-                graphql_url,
+                GRAPHQL_URL,
                 json=graphql_query,
                 headers=headers,
                 timeout=self.timeout
             )
 
             if response.status_code == 200:
-                data = response.json()
-                product_data = data.get('data', {}).get('product', {})
-
-                if product_data:
-                    name = product_data.get('title', 'Неизвестный товар')
-                    price_info = product_data.get('price', {})
-
-                    price = None
-                    if isinstance(price_info, dict):
-                        price_str = price_info.get('price')
-                        if price_str:
-                            try:
-                                price = float(price_str)
-                            except:
-                                pass
-
-                    if name:
-                        return {
-                            'product_id': product_id,
-                            'name': name,
-                            'price': price,
-                            'url': f'https://www.ozon.ru/product/{product_id}/'
-                        }
+                return self._parse_graphql_response(response.json(), product_id)
 
         except Exception as e:
             print(f"Ошибка в _try_graphql_api: {e}")
 
         return None
 
+    def _parse_graphql_response(self, data, product_id):
+        """Разбор ответа GraphQL API"""
+        product_data = data.get('data', {}).get('product', {})
+
+        if product_data:
+            name = product_data.get('title', 'Неизвестный товар')
+            price_info = product_data.get('price', {})
+
+            price = None
+            if isinstance(price_info, dict):
+                price_str = price_info.get('price')
+                if price_str:
+                    try:
+                        price = float(price_str)
+                    except:
+                        pass
+
+            if name:
+                return {
+                    'product_id': product_id,
+                    'name': name,
+                    'price': price,
+                    'url': canonical_product_url(product_id)
+                }
+
+        return None
+
+    def _mobile_request(self, product_id):
+        """Тело и заголовки запроса к мобильному API"""
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Origin': Config.OZON_BASE_URL,
+            'Referer': canonical_product_url(product_id),
+        }
+
+        payload = {
+            "productId": product_id,
+            "clientFeatures": ["webp"],
+            "layout": "SINGLE_PRODUCT"
+        }
+
+        return payload, headers
+
     def _try_mobile_api(self, url, product_id):
         """Мобильное API (резервный метод)"""
         try:
-            api_url = "https://api.ozon.ru/composer-api.bx/_action/productDetailV2"
-
-            headers = {
-                **self.session.headers,
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Origin': 'https://www.ozon.ru',
-                'Referer': f'https://www.ozon.ru/product/{product_id}/',
-            }
-
-            payload = {
-                "productId": product_id,
-                "clientFeatures": ["webp"],
-                "layout": "SINGLE_PRODUCT"
-            }
+            payload, headers = self._mobile_request(product_id)
 
             response = self.session.post(
-                api_url,
+                MOBILE_API_URL,
                 json=payload,
                 headers=headers,
                 timeout=self.timeout
             )
 
             if response.status_code == 200:
-                data = response.json()
-
-                # Пытаемся найти продукт в ответе
-                product = data.get('product') or data.get('widgetStates', {})
-
-                if isinstance(product, dict):
-                    name = product.get('title') or product.get('name', 'Неизвестный товар')
-
-                    # Ищем цену в разных форматах
-                    price = None
-
-                    # Вариант 1: Прямо в объекте продукта
-                    price_info = product.get('price')
-                    if isinstance(price_info, dict):
-                        price_str = price_info.get('price') or price_info.get('value')
-                        if price_str:
-                            try:
-                                price = float(str(price_str).replace(' ', '').replace(',', '.'))
-                            except:
-                                pass
-
-                    # Вариант 2: Ищем в строковом представлении
-                    if not price:
-                        data_str = json.dumps(data)
-                        price_match = re.search(r'"price":\s*["\']?(\d+(?:[.,]\d+)?)', data_str)
-                        if price_match:
-                            try:
-                                price = float(price_match.group(1).replace(',', '.'))
-                            except:
-                                pass
-
-                    if name:
-                        return {
-                            'product_id': product_id,
-                            'name': name[:200],  # Ограничиваем длину
-                            'price': price,
-                            'url': f'https://www.ozon.ru/product/{product_id}/'
-                        }
+                return self._parse_mobile_response(response.json(), product_id)
 
         except Exception as e:
             print(f"Ошибка в _try_mobile_api: {e}")
 
         return None
 
+    def _parse_mobile_response(self, data, product_id):
+        """Разбор ответа мобильного API"""
+        name = None
+        price = None
+
+        # Вариант 1: Прямо в объекте продукта
+        product = data.get('product')
+        if isinstance(product, dict):
+            name = product.get('title') or product.get('name')
+
+            price_info = product.get('price')
+            if isinstance(price_info, dict):
+                price_str = price_info.get('price') or price_info.get('value')
+                if price_str:
+                    try:
+                        price = float(str(price_str).replace(' ', '').replace(',', '.'))
+                    except:
+                        pass
+
+        # Вариант 2: Состояния виджетов - разбираются только виджеты названия, цены и наличия
+        if not name or not price:
+            found = product_from_states(states_from_json(data))
+            if found:
+                name = name or found['name']
+                price = price or found['price']
+
+        if not name and not price:
+            return None
+
+        return {
+            'product_id': product_id,
+            'name': (name or 'Неизвестный товар')[:200],  # Ограничиваем длину
+            'price': price,
+            'url': canonical_product_url(product_id)
+        }
+
     def _extract_name_from_html(self, html):
         """Извлекаем название из HTML"""
         patterns = [
@@ -358,4 +391,182 @@ class OzonParser:
                 except ValueError:
                     continue
 
-        return None
\ No newline at end of file
+        return None
+
+
+class AsyncOzonParser(OzonParser):
+    """Асинхронная версия OzonParser поверх httpx.
+
+    Разбор ответов общий с OzonParser, отличается только сетевой слой:
+    один пул соединений с keep-alive и HTTP/2 на весь процесс и ограничение
+    числа одновременных запросов к одному хосту. Методы get_product_info,
+    extract_product_id и _try_* здесь - корутины.
+    """
+
+    def __init__(self):
+        self.config = Config()
+        self.timeout = 15
+        self._client = None
+        self._host_limits = {}
+
+    def _get_client(self):
+        # Клиент создаём лениво - внутри работающего event loop
+        if self._client is None:
+            headers = dict(BROWSER_HEADERS)
+            # Заголовок Connection запрещён в HTTP/2, br требует отдельного пакета
+            headers.pop('Connection', None)
+            headers['Accept-Encoding'] = 'gzip, deflate'
+
+            self._client = httpx.AsyncClient(
+                http2=True,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=self.config.HTTP_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    def _host_limit(self, url):
+        host = urlparse(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.config.HTTP_PER_HOST_LIMIT)
+            self._host_limits[host] = semaphore
+        return semaphore
+
+    async def _request(self, method, url, **kwargs):
+        """HTTP запрос с ограничением одновременных запросов к хосту"""
+        async with self._host_limit(url):
+            return await self._get_client().request(method, url, **kwargs)
+
+    async def extract_product_id(self, url):
+        """Извлекает ID товара из разных форматов ссылок Ozon"""
+        url = url.strip()
+
+        # Если короткая ссылка (ozon.ru/t/...)
+        if '/t/' in url:
+            try:
+                # Следуем по редиректу
+                response = await self._request('HEAD', url, follow_redirects=True)
+                url = str(response.url)
+                print(f"Перенаправлено на: {url}")
+            except Exception as e:
+                print(f"Ошибка редиректа: {e}")
+
+        return product_id_from_url(url)
+
+    async def get_product_info(self, url):
+        """Основной метод получения информации о товаре"""
+        print(f"\nПарсим URL: {url}")
+
+        # Получаем ID товара
+        product_id = await self.extract_product_id(url)
+        if not product_id:
+            print("❌ Не удалось извлечь ID товара")
+            return None
+
+        # Пробуем несколько методов по порядку
+        methods = [
+            self._try_direct_html,  # Прямой парсинг HTML
+            self._try_graphql_api,  # GraphQL API
+            self._try_mobile_api,  # Мобильное API
+        ]
+
+        for method in methods:
+            print(f"\nПробуем метод: {method.__name__}")
+            result = await method(url, product_id)
+            if result and result.get('price'):
+                print(f"✅ Успех через {method.__name__}")
+                return result
+            elif result:
+                print(f"⚠️ Метод {method.__name__} вернул данные без цены")
+                # Возвращаем хотя бы название
+                return result
+
+        print("❌ Все методы не сработали")
+        return None
+
+    async def _try_direct_html(self, url, product_id):
+        """Прямой парсинг HTML страницы"""
+        try:
+            # Используем полную ссылку с ID
+            full_url = canonical_product_url(product_id)
+
+            if self.config.HTTP_STREAM_HTML:
+                return await self._stream_direct_html_async(product_id, full_url)
+
+            response = await self._request('GET', full_url, follow_redirects=True)
+
+            if response.status_code != 200:
+                print(f"HTTP {response.status_code} для {full_url}")
+                return None
+
+            with EXTRACTION_SECONDS.labels('direct_html').time():
+                return self._parse_direct_html(response.text, product_id, full_url)
+
+        except Exception as e:
+            print(f"Ошибка в _try_direct_html: {e}")
+
+        return None
+
+    async def _stream_direct_html_async(self, product_id, full_url):
+        """Потоковая загрузка страницы через httpx (по HTTP/2 обрывается только поток, не соединение)"""
+        scanned = 0.0
+        async with self._host_limit(full_url):
+            async with self._get_client().stream('GET', full_url, follow_redirects=True) as response:
+                if response.status_code != 200:
+                    print(f"HTTP {response.status_code} для {full_url}")
+                    return None
+
+                scanner = LdJsonScanner(response.encoding)
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    started = time.perf_counter()
+                    found = scanner.feed(chunk) is not None
+                    scanned += time.perf_counter() - started
+                    if found:
+                        break
+
+        started = time.perf_counter()
+        result = self._finish_direct_html(scanner, product_id, full_url)
+        EXTRACTION_SECONDS.labels('direct_html').observe(scanned + time.perf_counter() - started)
+        return result
+
+    async def _try_graphql_api(self, url, product_id):
+        """Попытка через GraphQL API Ozon"""
+        try:
+            graphql_query, headers = self._graphql_request(product_id)
+
+            response = await self._request('POST', GRAPHQL_URL, json=graphql_query, headers=headers)
+
+            if response.status_code == 200:
+                with EXTRACTION_SECONDS.labels('graphql_api').time():
+                    return self._parse_graphql_response(response.json(), product_id)
+
+        except Exception as e:
+            print(f"Ошибка в _try_graphql_api: {e}")
+
+        return None
+
+    async def _try_mobile_api(self, url, product_id):
+        """Мобильное API (резервный метод)"""
+        try:
+            payload, headers = self._mobile_request(product_id)
+
+            response = await self._request('POST', MOBILE_API_URL, json=payload, headers=headers)
+
+            if response.status_code == 200:
+                with EXTRACTION_SECONDS.labels('mobile_api').time():
+                    return self._parse_mobile_response(response.json(), product_id)
+
+        except Exception as e:
+            print(f"Ошибка в _try_mobile_api: {e}")
+
+        return None
+
+    async def close(self):
+        """Закрытие пула соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .driver_manager import driver_manager
+
+logger = logging.getLogger(__name__)
+
+
+class ParserPool:
+    """Пул "тёплых" Selenium-парсеров.
+
+    Каждый парсер держит свой браузер и работает в отдельном потоке,
+    поэтому несколько товаров можно проверять параллельно, не блокируя
+    event loop бота. Браузеры общие для всех пулов процесса (DriverManager):
+    пул добавляет в общий набор size мест (браузеров или вкладок, см.
+    SELENIUM_TABS) и одновременно занимает не больше size из них. Замену
+    старых и упавших браузеров берёт на себя DriverManager.
+    """
+
+    def __init__(self, size=1, headless=True, name='selenium', manager=None):
+        self.size = max(1, size)
+        self.name = name
+        self.manager = manager or driver_manager
+        self.manager.reserve(self.size, headless=headless)
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix=name)
+        self._slots = None
+
+        # Статистика очереди для подбора размера пула
+        self.waiting = 0  # Запросов ждут свободный браузер
+        self.busy = 0  # Браузеров занято
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _free_slots(self):
+        # Семафор создаём лениво - внутри уже работающего event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        return self._slots
+
+    async def get_product_info(self, url):
+        """Берёт свободный парсер из пула и получает информацию о товаре в его потоке"""
+        return await self.run('get_product_info', url)
+
+    async def run(self, method, *args):
+        """Вызывает метод method свободного парсера в потоке пула"""
+        slots = self._free_slots()
+
+        queued_at = time.monotonic()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+            try:
+                parser = await self.manager.acquire()
+            except BaseException:
+                slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        wait = time.monotonic() - queued_at
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > 1:
+            logger.info(f"Пул {self.name}: запрос ждал свободный браузер {wait:.1f} с")
+
+        self.busy += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.manager.call, parser, method, *args)
+        finally:
+            self.busy -= 1
+            self.manager.release(parser)
+            slots.release()
+
+    def stats(self):
+        """Загрузка пула: размер, занятые браузеры, глубина очереди и время ожидания"""
+        return {
+            'size': self.size,
+            'busy': self.busy,
+            'waiting': self.waiting,
+            'requests': self.requests,
+            'avg_wait': self.total_wait / self.requests if self.requests else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+    def traffic_stats(self):
+        """Суммарные страницы и байты, загруженные браузерами процесса"""
+        return self.manager.traffic_stats()
+
+    def close(self):
+        """Закрывает браузеры процесса (при остановке бота или воркера)"""
+        self.manager.close()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,219 @@
+# bot/scheduler.py
+import asyncio
+import heapq
+import logging
+import math
+import time
+import zlib
+from datetime import datetime, timezone
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def to_timestamp(value):
+    """Наивное UTC-время из базы -> unix timestamp"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def slot_offset(product_id, interval):
+    """Детерминированное смещение товара внутри интервала: одинаковое при каждом запуске,
+    но разное у разных товаров, поэтому проверки равномерно распределяются по интервалу"""
+    return zlib.crc32(str(product_id).encode()) % max(int(interval), 1)
+
+
+def next_slot(product_id, interval, now):
+    """Ближайшее после now время слота товара"""
+    offset = slot_offset(product_id, interval)
+    return now - ((now - offset) % interval) + interval
+
+
+def from_timestamp(value):
+    """Unix timestamp -> наивное UTC-время для базы"""
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+def plan_check(product_id, interval, changed, subscribers, mode, now):
+    """Следующая проверка товара: (новый базовый интервал в секундах, время проверки)
+
+    :param interval: текущий базовый интервал товара
+    :param changed: результат проверки - True, False или None (ошибка)
+    :param subscribers: число подписчиков товара
+    :param mode: 'adaptive' или 'rolling'
+    """
+    config = Config()
+
+    if mode == 'rolling':
+        # Следующий слот товара; пропущенные из-за опоздания слоты не наверстываем
+        interval = config.CHECK_INTERVAL
+        return interval, next_slot(product_id, interval, now)
+
+    if changed:
+        interval *= config.CHECK_SPEEDUP_FACTOR
+    elif changed is False:
+        interval *= config.CHECK_BACKOFF_FACTOR
+    # При ошибке проверки интервал не меняем
+
+    interval = min(max(interval, config.CHECK_MIN_INTERVAL), config.CHECK_MAX_INTERVAL)
+
+    # 10 подписчиков - вдвое чаще, 100 - втрое
+    effective = interval / (1 + math.log10(max(subscribers, 1)))
+    return interval, now + max(effective, config.CHECK_MIN_INTERVAL)
+
+
+class CheckScheduler:
+    """Адаптивное расписание проверок цен.
+
+    Для каждого товара хранится время следующей проверки (next_check_at) в
+    индексированной очереди с приоритетом. Интервал товара сокращается,
+    когда цена меняется, и растёт, пока она стабильна; у популярных товаров
+    (много подписчиков) он дополнительно короче. Цикл непрерывно отдаёт
+    воркерам товары, срок проверки которых наступил.
+
+    В режиме 'rolling' интервал у всех товаров один - CHECK_INTERVAL, но
+    каждый товар проверяется в своём слоте внутри него, так что нагрузка
+    равномерна, а не приходится на начало часа. Товар, который ещё
+    проверяется, повторно в очередь не попадает, а опоздавшая проверка
+    переносится на следующий слот, а не догоняет пропущенные.
+    """
+
+    def __init__(self, db, check, workers, on_tick=None, mode=None):
+        """
+        :param db: AsyncDatabase
+        :param check: корутина check(product) -> True (цена изменилась), False (не изменилась), None (ошибка)
+        :param workers: число параллельных проверок
+        :param on_tick: корутина, вызываемая на каждом шаге цикла (например, рассылка накопленного)
+        :param mode: 'adaptive' или 'rolling' (по умолчанию - Config.SCHEDULE_MODE)
+        """
+        self.db = db
+        self.check = check
+        self.workers = workers
+        self.on_tick = on_tick
+        self.config = Config()
+        self.mode = mode or self.config.SCHEDULE_MODE
+
+        # Индексированная очередь: куча (срок, product_id) и актуальный срок каждого товара.
+        # Устаревшие записи кучи (срок не совпадает с _due) пропускаются при извлечении
+        self._heap = []
+        self._due = {}
+
+        self._products = {}  # product_id -> Product
+        self._intervals = {}  # product_id -> базовый интервал (в секундах)
+        self._subscribers = {}  # product_id -> число подписчиков
+        self._in_flight = set()
+
+    def schedule(self, product_id, due):
+        """Назначает (или переназначает) срок проверки товара"""
+        self._due[product_id] = due
+        heapq.heappush(self._heap, (due, product_id))
+
+    def _pop_due(self, now):
+        """Извлекает товары, срок проверки которых наступил"""
+        while self._heap and self._heap[0][0] <= now:
+            due, product_id = heapq.heappop(self._heap)
+            if self._due.get(product_id) != due:
+                continue  # Устаревшая запись
+            del self._due[product_id]
+            yield product_id
+
+    def _next_due(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def refresh(self):
+        """Подхватывает новые и удалённые товары и число подписчиков из базы"""
+        products = await self.db.get_all_tracked_products()
+        self._subscribers = await self.db.get_subscriber_counts()
+
+        now = time.time()
+        current = set()
+        for product in products:
+            current.add(product.id)
+            if product.id in self._in_flight:
+                continue
+
+            self._products[product.id] = product
+            if product.id not in self._due:
+                self._intervals[product.id] = product.check_interval or self.config.CHECK_INTERVAL
+                if product.next_check_at and self.mode != 'rolling':
+                    due = to_timestamp(product.next_check_at)
+                else:
+                    # Новые товары (и все товары в режиме rolling) - в свой слот, а не все сразу
+                    due = next_slot(product.id, self.config.CHECK_INTERVAL, now)
+                self.schedule(product.id, due)
+
+        for product_id in list(self._products):
+            if product_id not in current:
+                self._products.pop(product_id, None)
+                self._intervals.pop(product_id, None)
+                self._due.pop(product_id, None)
+
+    async def _worker(self, queue):
+        while True:
+            product_id = await queue.get()
+            product = self._products.get(product_id)
+            if product is None:
+                self._in_flight.discard(product_id)
+                continue
+
+            try:
+                changed = await self.check(product)
+            except Exception as e:
+                logger.error(f"Ошибка при проверке товара {product_id}: {e}")
+                changed = None
+
+            interval, next_check = plan_check(
+                product_id,
+                self._intervals.get(product_id, self.config.CHECK_INTERVAL),
+                changed,
+                self._subscribers.get(product_id, 0),
+                self.mode,
+                time.time(),
+            )
+            self._intervals[product_id] = interval
+            self._in_flight.discard(product_id)
+            if product_id in self._products:
+                self.schedule(product_id, next_check)
+
+            try:
+                await self.db.schedule_product(product_id, from_timestamp(next_check), int(interval))
+            except Exception as e:
+                logger.error(f"Ошибка сохранения расписания товара {product_id}: {e}")
+
+            await asyncio.sleep(self.config.CHECK_REQUEST_DELAY)  # Задержка между запросами
+
+    async def run(self):
+        """Бесконечный цикл: раздаёт воркерам товары, срок проверки которых наступил"""
+        queue = asyncio.Queue(maxsize=self.config.CHECK_QUEUE_SIZE)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        logger.info(f"Расписание проверок ({self.mode}) запущено, воркеров: {self.workers}")
+
+        last_refresh = 0.0
+        try:
+            while True:
+                now = time.time()
+                if now - last_refresh >= self.config.SCHEDULER_REFRESH_INTERVAL:
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        logger.error(f"Ошибка обновления списка товаров: {e}")
+                    last_refresh = now
+
+                for product_id in self._pop_due(now):
+                    self._in_flight.add(product_id)
+                    await queue.put(product_id)  # Ждёт, если воркеры не успевают
+
+                if self.on_tick:
+                    try:
+                        await self.on_tick()
+                    except Exception as e:
+                        logger.error(f"Ошибка в шаге расписания: {e}")
+
+                next_due = self._next_due()
+                delay = 1.0 if next_due is None else next_due - time.time()
+                await asyncio.sleep(min(max(delay, 0.1), 1.0))
+        finally:
+            for worker in workers:
+                worker.cancel()
@@ -1,25 +1,164 @@
 # bot/selenium_parser.py
 import time
 import re
+import json
+import base64
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+import requests
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import (JavascriptException, NoSuchElementException, TimeoutException,
+                                        WebDriverException)
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
+from .config import Config
+from .links import canonical_product_url, product_id_from_url, short_link_key
+from .widget_states import is_widget_states_url, product_from_states, states_from_html, states_from_json
+from .metrics import DRIVER_GET_SECONDS, EXTRACTION_SECONDS, PAGE_WAIT_SECONDS, TAB_LOAD_SECONDS, TABS_IN_FLIGHT
+
+# Страница готова, когда заполнены заголовок и виджет цены (или товар помечен как отсутствующий)
+PAGE_READY_SCRIPT = """
+var heading = document.querySelector("[data-widget='webProductHeading'] h1") || document.querySelector('h1');
+if (!heading || !heading.innerText.trim()) {
+    return false;
+}
+var price = document.querySelector("[data-widget='webPrice']");
+if (price && /\\d/.test(price.innerText)) {
+    return true;
+}
+return !!document.querySelector("[data-widget='webOutOfStock'], [data-testid='out-of-stock']");
+"""
+
+# Переходы без ожидания загрузки (вкладки, перехват ответов): пока новый документ
+# не загружен, открыт старый с пометкой, и его готовность не засчитывается
+MARK_STALE_SCRIPT = "window.__stalePage = true;"
+TAB_NAVIGATE_SCRIPT = MARK_STALE_SCRIPT + " window.location.href = arguments[0];"
+NEW_PAGE_READY_SCRIPT = "if (window.__stalePage) {\n    return false;\n}" + PAGE_READY_SCRIPT
+
+# Адрес вкладки, когда в ней уже открыт новый документ (для разворачивания коротких ссылок)
+TAB_LOCATION_SCRIPT = "return window.__stalePage ? null : window.location.href;"
+
+# Пауза между кругами опроса вкладок (в секундах)
+TAB_POLL_INTERVAL = 0.05
+# Режим fixed во вкладках: паузы _wait_fixed и _extract_product_data (3 + 1 + 3 + 1 с)
+# отсчитываются от перехода, а не проспаны в потоке вкладок
+TAB_FIXED_SCROLL_AFTER = 3
+TAB_FIXED_WAIT = 8
+
+# Сбор названия, текстов цены и наличия за один вызов execute_script
+# (вместо отдельного HTTP-запроса к WebDriver на каждый элемент)
+EXTRACT_SCRIPT = r"""
+function text(el) {
+    return el ? (el.innerText || '').trim() : '';
+}
+
+var result = {title: '', price_texts: [], fallback_texts: [], availability: []};
+
+var titleSelectors = arguments[0];
+for (var i = 0; i < titleSelectors.length; i++) {
+    var title = text(document.querySelector(titleSelectors[i]));
+    if (title) {
+        result.title = title;
+        break;
+    }
+}
+
+var widget = document.querySelector("[data-widget='webPrice']");
+if (widget) {
+    ['span', 'div', 'b', 'strong'].forEach(function (tag) {
+        widget.querySelectorAll(tag).forEach(function (el) {
+            var t = text(el);
+            if (t && /\d/.test(t)) {
+                result.price_texts.push(t);
+            }
+        });
+    });
+}
+
+if (!result.price_texts.length) {
+    var all = document.querySelectorAll('*');
+    for (var j = 0; j < all.length && j < 100; j++) {
+        var t = text(all[j]);
+        if (t.indexOf('₽') !== -1 && /\d/.test(t)) {
+            result.fallback_texts.push(t.slice(0, 500));
+        }
+    }
+}
+
+arguments[1].forEach(function (selector) {
+    var texts = [];
+    document.querySelectorAll(selector).forEach(function (el) {
+        texts.push(text(el).toLowerCase());
+    });
+    result.availability.push(texts);
+});
+
+return result;
+"""
+
+# Сколько байт страница загрузила по сети (сама страница и все её ресурсы)
+PAGE_BYTES_SCRIPT = """
+var total = 0;
+performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource')).forEach(function (entry) {
+    total += entry.transferSize || 0;
+});
+return total;
+"""
+
+TITLE_SELECTORS = [
+    "h1",  # Основной заголовок
+    "[data-widget='webProductHeading']",  # Виджет
+    "[data-widget='webProductHeading'] h1",  # Заголовок внутри виджета
+    ".product-page__title",  # Класс заголовка
+]
+
+AVAILABILITY_SELECTORS = [
+    "[data-testid='out-of-stock']",
+    ".out-of-stock",
+    ".unavailable",
+    "[aria-label*='нет в наличии']",
+    "[data-testid='add-to-cart-button']",
+]
 
 
 class OzonSeleniumParser:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, wait_mode=None, tabs=1):
         """
         Инициализация Selenium парсера
         :param headless: Запуск без графического интерфейса (True/False)
+        :param wait_mode: 'ready' - ждать готовности виджетов, 'fixed' - фиксированные паузы
+        :param tabs: сколько вкладок загружают страницы одновременно; при tabs > 1
+                     get_product_info можно вызывать из нескольких потоков сразу
         """
         self.headless = headless
+        self.tabs = max(1, tabs)
         self.driver = None
         self.timeout = 20  # Таймаут ожидания элементов
+        self.wait_mode = wait_mode or Config.SELENIUM_WAIT_MODE
+        self.ready_timeout = Config.SELENIUM_READY_TIMEOUT  # Потолок ожидания готовности
+        self.block_resources = Config.SELENIUM_BLOCK_RESOURCES
+        # Данные из перехваченных ответов с состояниями виджетов (только без вкладок и в режиме
+        # 'ready': перехвату нужен page_load_strategy 'none', а паузы 'fixed' отсчитываются от загрузки)
+        self.network_capture = Config.SELENIUM_NETWORK_CAPTURE and self.tabs == 1 and self.wait_mode == 'ready'
+        # Статистика загрузок: число страниц и переданные байты
+        self.stats = {'pages': 0, 'bytes': 0}
+        # Страниц, открытых текущим экземпляром браузера (для замены после BROWSER_MAX_PAGES)
+        self.pages_since_start = 0
+
+        # Режим вкладок: браузером управляет один поток, запросы приходят через очередь
+        self._tab_handles = []
+        self._tab_queue = queue.Queue()
+        self._tab_thread = None
+        self._tab_lock = threading.Lock()
+        # Загрузки во вкладках сейчас и за всё время, задержка по номеру вкладки
+        self.tab_stats = {'in_flight': 0, 'max_in_flight': 0}
+        self.tab_latency = {}  # Номер вкладки -> {'loads', 'total', 'max'} (в секундах)
 
     def setup_driver(self):
         """Настройка и запуск Яндекс.Браузера через YandexDriver"""
@@ -32,6 +171,21 @@ class OzonSeleniumParser:
         if self.headless:
             chrome_options.add_argument('--headless')
 
+        if self.tabs > 1:
+            # Команды не ждут загрузки страницы: пока грузится одна вкладка, опрашиваем другие.
+            # Фоновые вкладки не должны притормаживаться
+            chrome_options.page_load_strategy = 'none'
+            chrome_options.add_argument('--disable-background-timer-throttling')
+            chrome_options.add_argument('--disable-backgrounding-occluded-windows')
+            chrome_options.add_argument('--disable-renderer-backgrounding')
+        elif self.network_capture:
+            # driver.get возвращается сразу, ответы страницы читаем из лога производительности
+            chrome_options.page_load_strategy = 'none'
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        elif self.wait_mode == 'ready':
+            # driver.get возвращается после DOMContentLoaded, дальше ждём сами виджеты
+            chrome_options.page_load_strategy = 'eager'
+
         # 3. Настройки для обхода защиты
         chrome_options.add_argument('--disable-blink-features=AutomationControlled')
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
@@ -44,61 +198,157 @@ class OzonSeleniumParser:
         chrome_options.add_argument('--window-size=1920,1080')
         chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
 
+        if self.block_resources:
+            # Хосты не из списка разрешённых (аналитика, реклама, сторонние скрипты) не резолвятся
+            rules = ['MAP * ~NOTFOUND'] + [f'EXCLUDE {host.strip()}' for host in Config.SELENIUM_ALLOWED_HOSTS]
+            chrome_options.add_argument(f"--host-resolver-rules={', '.join(rules)}")
+            # Картинки не загружаем вовсе
+            chrome_options.add_experimental_option(
+                'prefs', {'profile.managed_default_content_settings.images': 2}
+            )
+
         # 5. Указываем путь к драйверу yandexdriver.exe
         driver_path = r'D:\ZERO\2025 12 15 OZON_BOT\Драйвер\yandexdriver.exe'
         service = Service(executable_path=driver_path)
 
         # 6. Создаём драйвер
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.pages_since_start = 0
 
         # 7. Маскируем автоматизацию
         self.driver.execute_script(
             "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
         )
 
+        # 8. Фильтрация ресурсов и учёт трафика
+        self._setup_network()
+
+        # 9. Вкладки для одновременных загрузок
+        if self.tabs > 1:
+            self._open_tabs()
+
         print(f"✅ Яндекс.Браузер запущен через YandexDriver")
         return self.driver
 
+    def _setup_network(self):
+        """Блокировка картинок, шрифтов и медиа через CDP и подготовка учёта трафика"""
+        try:
+            # Без этого браузер хранит тайминги только первых 250 ресурсов страницы
+            self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+                'source': 'performance.setResourceTimingBufferSize(5000);'
+            })
+
+            if self.block_resources:
+                self.driver.execute_cdp_cmd('Network.enable', {})
+                self.driver.execute_cdp_cmd('Network.setBlockedURLs', {
+                    'urls': Config.SELENIUM_BLOCKED_URL_PATTERNS
+                })
+                print(f"✅ Блокировка ресурсов включена ({len(Config.SELENIUM_BLOCKED_URL_PATTERNS)} шаблонов)")
+        except Exception as e:
+            print(f"⚠️ Не удалось настроить фильтрацию ресурсов: {e}")
+
+    def _open_tabs(self):
+        """Открывает недостающие вкладки; CDP-настройки действуют на вкладку, поэтому - для каждой"""
+        handles = self.driver.window_handles
+        while len(handles) < self.tabs:
+            self.driver.switch_to.new_window('tab')
+            self._setup_network()
+            handles = self.driver.window_handles
+        self._tab_handles = handles[:self.tabs]
+        print(f"✅ Открыто вкладок: {len(self._tab_handles)}")
+
+    def _count_page_bytes(self):
+        """Учёт байт, загруженных текущей страницей"""
+        try:
+            page_bytes = int(self.driver.execute_script(PAGE_BYTES_SCRIPT) or 0)
+        except Exception:
+            return 0
+
+        self.stats['pages'] += 1
+        self.stats['bytes'] += page_bytes
+        self.pages_since_start += 1
+        return page_bytes
+
     def close_driver(self):
         """Закрытие драйвера"""
+        self._stop_tabs()
         if self.driver:
-            self.driver.quit()
-            print("✅ Драйвер Chrome закрыт")
+            try:
+                self.driver.quit()
+                print("✅ Драйвер Chrome закрыт")
+            finally:
+                self.driver = None
+
+    def is_alive(self):
+        """Отвечает ли сессия браузера (без драйвера - True: он запустится при первом запросе)"""
+        if not self.driver or self.tabs > 1:
+            # В режиме вкладок упавший браузер перезапускает сам поток вкладок
+            return True
+        try:
+            self.driver.execute_script('return 1')
+            return True
+        except Exception:
+            # Упавший chromedriver даёт не только WebDriverException, но и ошибки соединения
+            return False
 
-    def extract_product_id(self, url):
-        """Извлекает ID товара из разных форматов ссылок Ozon"""
+    def restart_driver(self):
+        """Перезапуск браузера после падения сессии"""
+        try:
+            self.close_driver()
+        except Exception as e:
+            print(f"⚠️ Ошибка закрытия упавшего драйвера: {e}")
+            self.driver = None
+        return self.setup_driver()
+
+    def extract_product_id(self, url, browser=True):
+        """Извлекает ID товара из разных форматов ссылок Ozon.
+
+        :param browser: разворачивать короткую ссылку в браузере, если не помог HTTP-редирект
+        """
         url = url.strip()
 
         # Если короткая ссылка (ozon.ru/t/...)
-        if '/t/' in url:
-            try:
-                print(f"  Обнаружена короткая ссылка, пробую редирект...")
-                # Используем head-запрос для редиректа без полной загрузки
-                self.driver.get(url)
-                time.sleep(2)
-                url = self.driver.current_url
-                print(f"  Перенаправлено на: {url}")
-            except Exception as e:
-                print(f"  Ошибка редиректа: {e}")
-
-        # ПАТТЕРНЫ В ПРИОРИТЕТНОМ ПОРЯДКЕ:
-        patterns = [
-            r'/product/(\d+)/',  # 1. /product/123456/
-            r'-(\d+)/?$',  # 2. ...-123456/ (ИЩЕМ ЧИСЛА ПОСЛЕ ПОСЛЕДНЕГО ДЕФИСА)
-            r'[?&]productId=(\d+)',  # 3. ?productId=123456
-            r'[?&]id=(\d+)',  # 4. ?id=123456
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                product_id = match.group(1)
-                print(f"✅ Найден ID '{product_id}' по паттерну: {pattern}")
-                return product_id
+        if short_link_key(url):
+            print(f"  Обнаружена короткая ссылка, пробую редирект...")
+            resolved = self._follow_redirects(url)
+            if not resolved and browser:
+                resolved = self.resolve_short_link(url)
+            url = resolved or url
+            print(f"  Перенаправлено на: {url}")
+            # Не развернулась - номер из самой короткой ссылки не ID товара
+            if short_link_key(url):
+                return None
+
+        # Те же правила, что у HTTP-парсера (bot/links.py)
+        return product_id_from_url(url)
 
-        print(f"❌ Не удалось найти ID в URL: {url}")
+    def _follow_redirects(self, url):
+        """Разворачивание короткой ссылки HTTP-запросом, без загрузки страницы в браузере"""
+        try:
+            response = requests.head(
+                url, headers=Config.OZON_HEADERS, allow_redirects=True, timeout=self.timeout
+            )
+            if not short_link_key(response.url):
+                return response.url
+        except requests.RequestException as e:
+            print(f"  Ошибка редиректа: {e}")
         return None
 
+    def resolve_short_link(self, url):
+        """Разворачивание короткой ссылки в браузере: ждём ухода с /t/, а не фиксированную паузу"""
+        if not self.driver:
+            self.setup_driver()
+
+        try:
+            self.driver.get(url)
+            WebDriverWait(self.driver, self.timeout).until(
+                lambda driver: not short_link_key(driver.current_url)
+            )
+            return self.driver.current_url
+        except Exception as e:
+            print(f"  Ошибка редиректа в браузере: {e}")
+            return None
+
     def get_product_info(self, url):
         """
         Основной метод получения информации о товаре
@@ -107,6 +357,9 @@ class OzonSeleniumParser:
         """
         print(f"\n🔍 Парсим URL: {url}")
 
+        if self.tabs > 1:
+            return self._load_in_tab(url)
+
         # Запускаем драйвер если ещё не запущен
         if not self.driver:
             self.setup_driver()
@@ -119,30 +372,32 @@ class OzonSeleniumParser:
 
         try:
             # Формируем правильный URL
-            product_url = f"https://www.ozon.ru/product/{product_id}/"
+            product_url = canonical_product_url(product_id)
             print(f"📦 Открываю страницу товара: {product_url}")
 
             # Открываем страницу
-            self.driver.get(product_url)
+            with DRIVER_GET_SECONDS.time():
+                if self.network_capture:
+                    self.driver.get_log('performance')  # Записи прошлой страницы не нужны
+                    self.driver.execute_script(MARK_STALE_SCRIPT)
+                self.driver.get(product_url)
 
-            # Ждём загрузки страницы
-            time.sleep(3)  # Базовая задержка
+            # Сначала - из ответов с состояниями виджетов, по мере их получения
+            product_info = self._capture_product_info() if self.network_capture else None
 
-            # Ожидаем загрузки основных элементов
-            try:
-                WebDriverWait(self.driver, self.timeout).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "h1"))
-                )
-                print("✅ Страница загрузилась")
-            except TimeoutException:
-                print("⚠️ Страница загрузилась медленно, продолжаем...")
+            if not product_info:
+                with PAGE_WAIT_SECONDS.time():
+                    if self.wait_mode == 'fixed':
+                        self._wait_fixed()
+                    else:
+                        self._wait_until_ready(NEW_PAGE_READY_SCRIPT if self.network_capture else PAGE_READY_SCRIPT)
 
-            # Делаем скролл для загрузки контента
-            self.driver.execute_script("window.scrollTo(0, 300);")
-            time.sleep(1)
+                # Получаем данные
+                with EXTRACTION_SECONDS.labels('selenium').time():
+                    product_info = self._extract_product_data()
 
-            # Получаем данные
-            product_info = self._extract_product_data()
+            page_bytes = self._count_page_bytes()
+            print(f"📶 Страница загрузила {page_bytes / 1024:.0f} КБ")
 
             if product_info:
                 product_info['product_id'] = product_id
@@ -156,20 +411,358 @@ class OzonSeleniumParser:
             print(f"⚠️ Ошибка при парсинге: {e}")
             return None
 
-    def _extract_product_data(self):
-        """Извлечение данных о товаре со страницы (С ОЖИДАНИЕМ)"""
+    def _capture_product_info(self):
+        """Данные товара из ответов с состояниями виджетов, перехваченных во время загрузки.
+
+        Читает лог производительности (события Network) и забирает тела
+        документа страницы и ответов page/json/v2 через Network.getResponseBody.
+        Возвращает результат, как только в состояниях есть цена (или товар
+        отсутствует), и останавливает дальнейшую загрузку страницы. None - если
+        раньше стала готова сама страница или истёк ready_timeout.
+        """
+        started = time.monotonic()
+        captured = {}  # requestId -> 'document' или 'json'
+        states = {}
+
+        while time.monotonic() - started < self.ready_timeout:
+            for entry in self.driver.get_log('performance'):
+                try:
+                    message = json.loads(entry['message'])['message']
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                params = message.get('params') or {}
+                if message.get('method') == 'Network.responseReceived':
+                    kind = self._capture_kind(params)
+                    if kind:
+                        captured[params.get('requestId')] = kind
+                    continue
+
+                if message.get('method') != 'Network.loadingFinished' or params.get('requestId') not in captured:
+                    continue
+
+                with EXTRACTION_SECONDS.labels('selenium_capture').time():
+                    states.update(self._captured_states(params['requestId'], captured.pop(params['requestId'])))
+                    product_info = product_from_states(states)
+
+                if product_info and (product_info['price'] is not None or not product_info['available']):
+                    waited = time.monotonic() - started
+                    PAGE_WAIT_SECONDS.observe(waited)
+                    print(f"✅ Данные из ответа страницы за {waited:.2f} с, цена: {product_info['price']}")
+                    try:
+                        self.driver.execute_script('window.stop();')  # Остальная страница не нужна
+                    except Exception:
+                        pass
+                    return product_info
+
+            # Страница отрисовалась раньше, чем нашлись состояния, - берём данные из неё
+            if self._page_ready(NEW_PAGE_READY_SCRIPT):
+                break
+            time.sleep(0.05)
+
+        print("⚠️ Состояния виджетов не перехвачены, извлекаю данные со страницы")
+        return None
+
+    @staticmethod
+    def _capture_kind(params):
+        """Нужен ли ответ: документ страницы товара или JSON с состояниями виджетов"""
+        url = (params.get('response') or {}).get('url', '')
+        if params.get('type') == 'Document' and '/product/' in url:
+            return 'document'
+        if is_widget_states_url(url):
+            return 'json'
+        return None
+
+    def _captured_states(self, request_id, kind):
+        """Состояния виджетов из тела перехваченного ответа"""
+        try:
+            response = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception as e:
+            print(f"⚠️ Не удалось получить тело ответа: {e}")
+            return {}
+
+        body = response.get('body') or ''
+        if response.get('base64Encoded'):
+            body = base64.b64decode(body).decode('utf-8', 'replace')
+        return states_from_html(body) if kind == 'document' else states_from_json(body)
+
+    def _load_in_tab(self, url):
+        """Передаёт ссылку потоку вкладок и ждёт результата (вызывается из потоков пула)"""
+        # ID ищем здесь, в потоке запроса: HTTP-редирект короткой ссылки не задерживает
+        # вкладки, а не развернувшуюся так ссылку развернёт сама вкладка
+        url = url.strip()
+        product_id = self.extract_product_id(url, browser=False)
+        if not product_id and not short_link_key(url):
+            print("❌ Не удалось извлечь ID товара")
+            return None
+
+        with self._tab_lock:
+            if self._tab_thread is None or not self._tab_thread.is_alive():
+                self._tab_thread = threading.Thread(target=self._run_tabs, name='browser-tabs', daemon=True)
+                self._tab_thread.start()
+
+        future = Future()
+        self._tab_queue.put((url, product_id, future, 0))
+        return future.result()
+
+    def _stop_tabs(self):
+        """Останавливает поток вкладок; ждущие запросы получают None"""
+        with self._tab_lock:
+            thread, self._tab_thread = self._tab_thread, None
+        if thread is None or thread is threading.current_thread():
+            return
+
+        self._tab_queue.put(None)
+        thread.join(timeout=self.timeout)
+
+    def _run_tabs(self):
+        """Поток, который один управляет браузером в режиме вкладок.
+
+        Раздаёт ссылки по свободным вкладкам и по кругу делает шаг каждой
+        загрузки (_poll_tab): переход без ожидания загрузки, проверка
+        готовности, разбор. Ни один шаг не ждёт - ожидания сведены к срокам,
+        которые проверяются на следующих кругах, поэтому страницы грузятся
+        одновременно, а команды WebDriver идут по одной - из этого потока.
+        """
+        pending = deque()
+        loads = {}  # Номер вкладки -> загрузка
+
+        while True:
+            # Блокируемся на очереди, только если всем вкладкам нечего делать
+            block = not pending and not loads
+            while True:
+                try:
+                    item = self._tab_queue.get(block=block)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._abort_tab_loads(pending, loads)
+                    return
+                pending.append(item)
+                block = False
+
+            try:
+                if not self.driver:
+                    self.setup_driver()
+
+                # Свободные вкладки берут следующие ссылки; переход - первым шагом загрузки
+                for index in range(len(self._tab_handles)):
+                    if index not in loads and pending:
+                        loads[index] = {'item': pending.popleft(), 'state': 'start'}
+                        self._update_tabs_in_flight(loads, +1)
+
+                for index, load in list(loads.items()):
+                    try:
+                        finished = self._poll_tab(index, load)
+                    except Exception as e:
+                        # Если упал браузер, _tab_error передаст ошибку дальше и загрузки повторятся
+                        self._tab_error(e)
+                        load['item'][2].set_result(None)
+                        finished = True
+                    if finished:
+                        del loads[index]
+                        self._update_tabs_in_flight(loads, -1)
+            except Exception as e:
+                self._recover_tabs(e, pending, loads)
+                continue
+
+            if loads:
+                time.sleep(TAB_POLL_INTERVAL)
+
+    def _poll_tab(self, index, load):
+        """Один шаг загрузки во вкладке, без ожидания; True - загрузка закончена и результат отдан.
+
+        Состояния: start - переход по ссылке, resolve - вкладка разворачивает
+        короткую ссылку, load - страница товара загружается.
+        """
+        url, product_id, future, attempt = load['item']
+        self.driver.switch_to.window(self._tab_handles[index])
+        now = time.monotonic()
+
+        if load['state'] == 'start':
+            load['started'] = now
+            if product_id:
+                self._navigate_tab(index, load, product_id)
+            else:
+                load['state'] = 'resolve'
+                print(f"🔗 Вкладка {index}: разворачиваю короткую ссылку {url}")
+                self.driver.execute_script(TAB_NAVIGATE_SCRIPT, url)
+            return False
+
+        if load['state'] == 'resolve':
+            location = self.driver.execute_script(TAB_LOCATION_SCRIPT)
+            if location and not short_link_key(location):
+                product_id = product_id_from_url(location)
+                if not product_id:
+                    future.set_result(None)
+                    return True
+                load['item'] = (url, product_id, future, attempt)
+                self._navigate_tab(index, load, product_id)
+            elif now - load['started'] >= self.timeout:
+                print(f"⚠️ Вкладка {index}: короткая ссылка не развернулась за {self.timeout} с")
+                future.set_result(None)
+                return True
+            return False
+
+        waited = now - load['navigated']
+        if self.wait_mode == 'fixed':
+            # Те же паузы, что в обычном режиме, но по часам: скролл, затем разбор
+            if not load.get('scrolled') and waited >= TAB_FIXED_SCROLL_AFTER:
+                self.driver.execute_script("window.scrollTo(0, 300);")
+                load['scrolled'] = True
+            if waited < TAB_FIXED_WAIT:
+                return False
+        elif not self._page_ready(NEW_PAGE_READY_SCRIPT):
+            if waited < self.ready_timeout:
+                return False
+            print(f"⚠️ Вкладка {index}: страница не готова за {self.ready_timeout} с, продолжаем...")
+        PAGE_WAIT_SECONDS.observe(waited)
+
+        with EXTRACTION_SECONDS.labels('selenium').time():
+            product_info = self._extract_product_data(wait=False)
+        if not product_info or product_info.get('price') is None:
+            # Извлечение глотает ошибки: если браузер упал, исключение здесь повторит загрузку
+            self.driver.execute_script('return 1')
+        self._count_page_bytes()
+
+        latency = time.monotonic() - load['started']
+        TAB_LOAD_SECONDS.labels(str(index)).observe(latency)
+        stats = self.tab_latency.setdefault(index, {'loads': 0, 'total': 0.0, 'max': 0.0})
+        stats['loads'] += 1
+        stats['total'] += latency
+        stats['max'] = max(stats['max'], latency)
+        print(f"✅ Вкладка {index}: страница разобрана за {latency:.2f} с")
+
+        if product_info:
+            product_info['product_id'] = product_id
+            product_info['url'] = load['product_url']
+        future.set_result(product_info or None)
+        return True
+
+    def _navigate_tab(self, index, load, product_id):
+        """Переход вкладки на страницу товара без ожидания загрузки"""
+        load['product_url'] = canonical_product_url(product_id)
+        load['navigated'] = time.monotonic()
+        load['state'] = 'load'
+        print(f"📦 Вкладка {index}: открываю {load['product_url']}")
+        self.driver.execute_script(TAB_NAVIGATE_SCRIPT, load['product_url'])
+
+    def _update_tabs_in_flight(self, loads, delta):
+        TABS_IN_FLIGHT.inc(delta)
+        self.tab_stats['in_flight'] = len(loads)
+        self.tab_stats['max_in_flight'] = max(self.tab_stats['max_in_flight'], len(loads))
+
+    def _tab_error(self, error):
+        """Ошибка в одной вкладке: если браузер жив, страдает только её загрузка, иначе - дальше"""
+        try:
+            self.driver.execute_script('return 1')
+        except Exception:
+            raise error
+        print(f"⚠️ Ошибка вкладки: {error}")
+
+    def _recover_tabs(self, error, pending, loads):
+        """Браузер упал или не запустился: перезапускаем и повторяем его загрузки один раз"""
+        print(f"⚠️ Браузер недоступен ({error}), перезапускаю")
+        TABS_IN_FLIGHT.dec(len(loads))
+        for load in loads.values():
+            url, product_id, future, attempt = load['item']
+            if attempt:
+                future.set_result(None)
+            else:
+                pending.appendleft((url, product_id, future, attempt + 1))
+        loads.clear()
+        self.tab_stats['in_flight'] = 0
+
+        try:
+            if self.driver:
+                self.driver.quit()
+        except Exception:
+            pass
+        self.driver = None
+        try:
+            self.setup_driver()
+        except Exception as e:
+            print(f"❌ Не удалось перезапустить браузер: {e}")
+            self._abort_tab_loads(pending, {})
+
+    def _abort_tab_loads(self, pending, loads):
+        """Ответ None на все ждущие и идущие загрузки"""
+        TABS_IN_FLIGHT.dec(len(loads))
+        for load in loads.values():
+            load['item'][2].set_result(None)
+        loads.clear()
+        while pending:
+            pending.popleft()[2].set_result(None)
+        self.tab_stats['in_flight'] = 0
+
+    def _wait_fixed(self):
+        """Старый режим ожидания: фиксированные паузы и скролл"""
+        # Ждём загрузки страницы
+        time.sleep(3)  # Базовая задержка
+
+        # Ожидаем загрузки основных элементов
+        try:
+            WebDriverWait(self.driver, self.timeout).until(
+                EC.presence_of_element_located((By.TAG_NAME, "h1"))
+            )
+            print("✅ Страница загрузилась")
+        except TimeoutException:
+            print("⚠️ Страница загрузилась медленно, продолжаем...")
+
+        # Делаем скролл для загрузки контента
+        self.driver.execute_script("window.scrollTo(0, 300);")
+        time.sleep(1)
+
+    def _page_ready(self, script):
+        """Готова ли страница; пока идёт переход, ошибка скрипта значит, что ещё нет"""
+        try:
+            return self.driver.execute_script(script)
+        except WebDriverException:
+            # "document unloaded while waiting for result", "cannot find context with specified id"
+            return False
+
+    def _wait_until_ready(self, script=PAGE_READY_SCRIPT):
+        """Ожидание готовности виджетов цены и заголовка (не дольше ready_timeout)"""
+        started = time.monotonic()
+        try:
+            # Во время перехода скрипт может упасть в выгружаемом документе - опрашиваем дальше
+            WebDriverWait(
+                self.driver, self.ready_timeout, poll_frequency=0.1, ignored_exceptions=(JavascriptException,)
+            ).until(lambda driver: driver.execute_script(script))
+            print(f"✅ Страница готова за {time.monotonic() - started:.2f} с")
+            return True
+        except TimeoutException:
+            print(f"⚠️ Страница не готова за {self.ready_timeout} с, продолжаем...")
+            return False
+
+    def _extract_product_data(self, wait=True):
+        """Извлечение данных о товаре со страницы (С ОЖИДАНИЕМ).
+
+        :param wait: False - без пауз режима fixed и без поэлементного пути, который
+                     ждёт элементы (для потока вкладок: паузы он отсчитывает сам)
+        """
         print("🔍 Начинаю извлечение данных о товаре...")
 
         try:
-            # ВАЖНО: Даём время на загрузку динамического контента
-            print("   Ожидаю загрузку динамического контента (3 секунды)...")
-            import time
-            time.sleep(3)  # Ждём 3 секунды
+            if wait and self.wait_mode == 'fixed':
+                # ВАЖНО: Даём время на загрузку динамического контента
+                print("   Ожидаю загрузку динамического контента (3 секунды)...")
+                time.sleep(3)  # Ждём 3 секунды
 
-            # Дополнительно: делаем небольшой скролл, чтобы активировать загрузку
-            self.driver.execute_script("window.scrollTo(0, 200);")
-            time.sleep(1)  # Ждём ещё секунду после скролла
+                # Дополнительно: делаем небольшой скролл, чтобы активировать загрузку
+                self.driver.execute_script("window.scrollTo(0, 200);")
+                time.sleep(1)  # Ждём ещё секунду после скролла
+
+            # Все данные за один запрос к браузеру
+            product_info = self._extract_all_in_one()
+            if product_info:
+                print(f"✅ Все данные извлечены. Название: '{product_info['name'][:50]}...', "
+                      f"Цена: {product_info['price']}")
+                return product_info
+            if not wait:
+                return None
 
+            # Запасной путь: поэлементное извлечение
             # 1. Извлекаем название
             print("   Шаг 1: Извлекаю название...")
             title = self._extract_title()
@@ -200,21 +793,63 @@ class OzonSeleniumParser:
                 'available': False
             }
 
+    def _extract_all_in_one(self):
+        """Извлечение названия, цены и наличия одним вызовом execute_script"""
+        try:
+            data = self.driver.execute_script(EXTRACT_SCRIPT, TITLE_SELECTORS, AVAILABILITY_SELECTORS)
+        except Exception as e:
+            print(f"⚠️ Ошибка скрипта извлечения: {e}")
+            return None
+
+        if not data:
+            return None
+
+        title = ' '.join((data.get('title') or '').split()) or "Неизвестный товар"
+
+        price = self._parse_price(data.get('price_texts') or [], r'(\d[\d\s\u2009]*)')
+        if price is None:
+            price = self._parse_price(data.get('fallback_texts') or [], r'(\d[\d\s\u2009]*)\s*₽')
+
+        return {
+            'name': title,
+            'price': price,
+            'available': self._parse_availability(data.get('availability') or [])
+        }
+
+    @staticmethod
+    def _parse_price(texts, pattern):
+        """Первая цена, найденная по шаблону в списке текстов"""
+        for text in texts:
+            match = re.search(pattern, text)
+            if match:
+                price_str = re.sub(r'[\s\u2009]+', '', match.group(1))
+                try:
+                    return float(price_str)
+                except ValueError:
+                    continue
+        return None
+
+    @staticmethod
+    def _parse_availability(groups):
+        """Наличие по текстам элементов из AVAILABILITY_SELECTORS (по умолчанию - в наличии)"""
+        for texts in groups:
+            for text in texts:
+                if 'нет' in text or 'out' in text or 'недоступ' in text:
+                    return False
+                elif 'купить' in text or 'корзину' in text or 'cart' in text:
+                    return True
+        return True
+
     def _extract_title(self):
         """Извлечение названия товара (улучшенная версия с ожиданием)"""
         print("🔍 Ищу название товара...")
 
-        # Сначала дадим время на загрузку
-        import time
-        time.sleep(1)
+        # В старом режиме сначала дадим время на загрузку
+        if self.wait_mode == 'fixed':
+            time.sleep(1)
 
         # Приоритетные селекторы
-        title_selectors = [
-            ("css selector", "h1"),  # Основной заголовок
-            ("css selector", "[data-widget='webProductHeading']"),  # Виджет
-            ("css selector", "[data-widget='webProductHeading'] h1"),  # Заголовок внутри виджета
-            ("css selector", ".product-page__title"),  # Класс заголовка
-        ]
+        title_selectors = [("css selector", selector) for selector in TITLE_SELECTORS]
 
         for by, value in title_selectors:
             try:
@@ -309,16 +944,7 @@ class OzonSeleniumParser:
     def _check_availability(self):
         """Проверка наличия товара"""
         try:
-            # Селекторы для проверки наличия
-            availability_selectors = [
-                "[data-testid='out-of-stock']",
-                ".out-of-stock",
-                ".unavailable",
-                "[aria-label*='нет в наличии']",
-                "[data-testid='add-to-cart-button']",
-            ]
-
-            for selector in availability_selectors:
+            for selector in AVAILABILITY_SELECTORS:
                 try:
                     elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
                     for element in elements:
@@ -0,0 +1,183 @@
+# bot/widget_states.py
+"""Состояния виджетов страницы товара Ozon (widgetStates).
+
+Страница товара заполняет виджеты из JSON: состояния первых виджетов
+встроены в HTML (атрибуты data-state у div id="state-<виджет>"), остальные
+приходят ответами entrypoint-api.bx/page/json/v2. В обоих случаях это
+словарь "ключ виджета -> JSON-строка", например
+"webPrice-3121879-default-1" -> '{"isAvailable": true, "price": "12 990 ₽"}'.
+
+Отсюда название, цену и наличие можно взять, не дожидаясь отрисовки и не
+завися от CSS-селекторов. Нужные поля описываются путями вида
+"webPrice.price": разбираются только состояния упомянутых в путях виджетов,
+остальные (полки рекомендаций и т.п.) остаются нетронутыми строками.
+"""
+import html
+import json
+import re
+
+# Ответы, в которых приходят состояния виджетов
+WIDGET_STATES_URL_RE = re.compile(r'/(?:entrypoint|composer)-api\.bx/(?:page/json/v2|_action/productDetail)')
+
+# Состояния, встроенные в HTML страницы
+STATE_ATTRIBUTE_RE = re.compile(
+    r'<div[^>]*\bid="state-(web(?:Price|ProductHeading|OutOfStock)[\w-]*)"[^>]*\bdata-state=\'([^\']*)\''
+)
+
+# Виджеты, из которых берутся данные о товаре
+PRICE_WIDGET = 'webPrice'
+HEADING_WIDGET = 'webProductHeading'
+OUT_OF_STOCK_WIDGET = 'webOutOfStock'
+
+
+def _decode(value):
+    """Значение из JSON-строки; строки, не похожие на объект или список, не трогаем"""
+    if isinstance(value, str) and value[:1] in ('{', '['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+class WidgetPath:
+    """Скомпилированный путь к полю состояния: "webPrice.price" - поле price виджета webPrice.
+
+    Путь из одного имени виджета только проверяет, что виджет есть в ответе.
+    """
+
+    __slots__ = ('widget', 'fields')
+
+    def __init__(self, path):
+        self.widget, *fields = path.split('.')
+        self.fields = tuple(fields)
+
+    def resolve(self, state):
+        """Значение по пути внутри уже разобранного состояния (None, если его нет)"""
+        value = state
+        for field in self.fields:
+            if not isinstance(value, dict):
+                return None
+            # Вложенные JSON-строки разбираются, только когда путь идёт внутрь них
+            value = _decode(value.get(field))
+        return value
+
+
+class StatesExtractor:
+    """Извлечение полей из widgetStates по скомпилированным путям.
+
+    fields - имя поля -> путь или кортеж путей (берётся первый найденный).
+    Ключи состояний просматриваются один раз, а JSON разбирается только у
+    виджетов из путей и только пока нужное поле не найдено.
+    """
+
+    def __init__(self, **fields):
+        self.fields = {
+            name: tuple(WidgetPath(path) for path in ((paths,) if isinstance(paths, str) else paths))
+            for name, paths in fields.items()
+        }
+        self.widgets = {path.widget for paths in self.fields.values() for path in paths}
+
+    def extract(self, states):
+        """Словарь поле -> значение (None, если поле не найдено)"""
+        # Сырые состояния нужных виджетов в порядке ответа; ключ - "<виджет>-<id>-..."
+        raw = {}
+        for key, value in states.items():
+            widget = key.partition('-')[0]
+            if widget in self.widgets:
+                raw.setdefault(widget, []).append(value)
+
+        decoded = {}
+        result = {}
+        for name, paths in self.fields.items():
+            result[name] = self._first(paths, raw, decoded)
+        return result
+
+    @staticmethod
+    def _first(paths, raw, decoded):
+        """Первое непустое значение по путям; каждое состояние разбирается не больше одного раза"""
+        for path in paths:
+            values = raw.get(path.widget, ())
+            if not path.fields:
+                if values:
+                    return True
+                continue
+
+            for index, value in enumerate(values):
+                key = (path.widget, index)
+                if key not in decoded:
+                    decoded[key] = _decode(value)
+                found = path.resolve(decoded[key]) if isinstance(decoded[key], dict) else None
+                if found is not None and found != '':
+                    return found
+        return None
+
+
+# Поля товара: название, цена (в карточке или цена по карте) и признаки наличия
+PRODUCT_FIELDS = StatesExtractor(
+    name=HEADING_WIDGET + '.title',
+    price=(PRICE_WIDGET + '.price', PRICE_WIDGET + '.cardPrice'),
+    available=PRICE_WIDGET + '.isAvailable',
+    out_of_stock=OUT_OF_STOCK_WIDGET,
+)
+
+
+def is_widget_states_url(url):
+    """Несёт ли ответ по этому адресу состояния виджетов"""
+    return bool(WIDGET_STATES_URL_RE.search(url))
+
+
+def states_from_json(data):
+    """widgetStates из ответа page/json/v2 или composer-api (пустой словарь, если их нет)"""
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return {}
+    states = data.get('widgetStates') if isinstance(data, dict) else None
+    return states if isinstance(states, dict) else {}
+
+
+def states_from_html(page):
+    """Состояния виджетов цены, заголовка и наличия, встроенные в HTML страницы"""
+    return {key: html.unescape(value) for key, value in STATE_ATTRIBUTE_RE.findall(page)}
+
+
+def parse_price(value):
+    """Цена из "12 990 ₽", "12990,50" или числа; None, если цены нет"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+
+    # \s покрывает и неразрывные пробелы в ценах Ozon
+    match = re.search(r'\d[\d\s]*(?:[.,]\d+)?', value)
+    if not match:
+        return None
+    try:
+        return float(re.sub(r'\s+', '', match.group(0)).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def product_from_states(states):
+    """Название, цена и наличие из состояний виджетов; None, если нет ни названия, ни цены"""
+    fields = PRODUCT_FIELDS.extract(states)
+
+    name = fields['name']
+    price = parse_price(fields['price'])
+    if not name and price is None:
+        return None
+
+    # Как и на странице, по умолчанию товар в наличии
+    if fields['out_of_stock'] is not None:
+        available = False
+    else:
+        available = True if fields['available'] is None else fields['available']
+
+    return {
+        'name': ' '.join(str(name).split()) if name else 'Неизвестный товар',
+        'price': price,
+        'available': bool(available),
+    }
+
@@ -0,0 +1,160 @@
+# bot/worker.py
+"""Воркер проверки цен - отдельный процесс без приёма команд Telegram.
+
+Несколько воркеров (на одной или разных машинах) работают с одной базой:
+каждый берёт в аренду пачку товаров, срок проверки которых наступил,
+продлевает аренду, пока их проверяет, и снимает её, сохраняя время
+следующей проверки. Аренду упавшего воркера через WORKER_LEASE_SECONDS
+подхватывают остальные. Бот при этом запускается с EXTERNAL_WORKERS=1.
+
+Запуск: python -m bot.worker (или python run.py --worker)
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+
+from .main import PriceTrackerBot
+from .metrics import start_metrics_server
+from .notifier import NotificationDispatcher, create_bot
+from .scheduler import from_timestamp, plan_check
+
+logger = logging.getLogger(__name__)
+
+
+class PriceCheckWorker(PriceTrackerBot):
+    """Проверка цен по аренде товаров в базе; уведомления отправляются напрямую через Bot API"""
+
+    def __init__(self, worker_id=None):
+        super().__init__()
+        self.worker_id = worker_id or self.config.WORKER_ID or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        )
+        # Интервалы считаются так же, как в CheckScheduler
+        self.mode = 'rolling' if self.config.SCHEDULE_MODE == 'rolling' else 'adaptive'
+        self._leased = set()  # Товары, которые воркер сейчас проверяет
+        self._subscribers = {}
+
+    async def _heartbeat(self):
+        """Продлевает аренду товаров, проверка которых ещё идёт"""
+        while True:
+            await asyncio.sleep(self.config.WORKER_HEARTBEAT_INTERVAL)
+            if not self._leased:
+                continue
+            try:
+                await self.db.renew_leases(self.worker_id, list(self._leased), self.config.WORKER_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды товаров: {e}")
+
+    async def _process(self, product, semaphore):
+        """Проверка одного арендованного товара и снятие аренды"""
+        async with semaphore:
+            try:
+                changed = await self._check_product(product, None)
+            except Exception as e:
+                logger.error(f"Ошибка при проверке товара {product.id}: {e}")
+                changed = None
+
+            interval, next_check = plan_check(
+                product.id,
+                product.check_interval or self.config.CHECK_INTERVAL,
+                changed,
+                self._subscribers.get(product.id, 0),
+                self.mode,
+                time.time(),
+            )
+            try:
+                await self.db.release_product(
+                    product.id, self.worker_id, from_timestamp(next_check), int(interval)
+                )
+            except Exception as e:
+                logger.error(f"Ошибка сохранения расписания товара {product.id}: {e}")
+            finally:
+                self._leased.discard(product.id)
+
+            await asyncio.sleep(self.config.CHECK_REQUEST_DELAY)  # Задержка между запросами
+
+    async def work(self):
+        """Бесконечный цикл: аренда пачки товаров, проверка, рассылка изменений"""
+        heartbeat = asyncio.create_task(self._heartbeat())
+        semaphore = asyncio.Semaphore(self.pool.size)
+        last_refresh = 0.0
+        logger.info(f"Воркер {self.worker_id} запущен, браузеров: {self.pool.size}")
+
+        try:
+            while True:
+                if time.time() - last_refresh >= self.config.SCHEDULER_REFRESH_INTERVAL:
+                    try:
+                        self._subscribers = await self.db.get_subscriber_counts()
+                    except Exception as e:
+                        logger.error(f"Ошибка получения числа подписчиков: {e}")
+                    last_refresh = time.time()
+
+                try:
+                    products = await self.db.claim_due_products(
+                        self.worker_id, self.config.WORKER_BATCH_SIZE, self.config.WORKER_LEASE_SECONDS
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка аренды товаров: {e}")
+                    products = []
+
+                if not products:
+                    await self._send_alerts(None)
+                    await asyncio.sleep(self.config.WORKER_POLL_INTERVAL)
+                    continue
+
+                logger.info(f"Воркер {self.worker_id} взял товаров: {len(products)}")
+                self._leased.update(product.id for product in products)
+                await asyncio.gather(*(self._process(product, semaphore) for product in products))
+                await self._send_alerts(None)
+        finally:
+            heartbeat.cancel()
+            # Недопроверенные товары сразу достаются другим воркерам
+            try:
+                released = await self.db.release_leases(self.worker_id)
+                logger.info(f"Воркер {self.worker_id} остановлен, снято аренд: {released}")
+            except Exception as e:
+                logger.error(f"Ошибка снятия аренды товаров: {e}")
+
+    async def _drain_notifications(self, timeout=30):
+        """Дожидается отправки накопленных уведомлений перед выходом"""
+        await self._send_alerts(None)
+        self.notifier.flush()
+        deadline = time.monotonic() + timeout
+        while self.notifier.pending()['queued'] and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+
+    async def main(self):
+        # SIGTERM (docker stop, systemd) завершает воркер так же аккуратно, как Ctrl+C
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass  # Windows
+
+        start_metrics_server(self.config.METRICS_PORT)
+        # Воркеру нужны только браузеры проверки цен, не браузеры команд бота
+        prewarm = asyncio.create_task(self.pool.manager.prewarm(self.pool.size))
+
+        async with create_bot(self.config.TELEGRAM_TOKEN) as bot:
+            self.notifier = NotificationDispatcher(bot)
+            try:
+                await self.work()
+            finally:
+                prewarm.cancel()
+                await self._drain_notifications()
+                await self.notifier.stop()
+                await self.fetcher.close()
+
+    def run(self):
+        """Запуск воркера"""
+        try:
+            asyncio.run(self.main())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+
+
+if __name__ == '__main__':
+    PriceCheckWorker().run()
@@ -5,7 +5,12 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from bot.main import PriceTrackerBot
+from bot.worker import PriceCheckWorker
 
 if __name__ == '__main__':
-    bot = PriceTrackerBot()
-    bot.run()
\ No newline at end of file
+    # --worker - только проверка цен, без приёма команд (см. bot/worker.py)
+    if '--worker' in sys.argv:
+        PriceCheckWorker().run()
+    else:
+        bot = PriceTrackerBot()
+        bot.run()
\ No newline at end of file